@@ -0,0 +1,284 @@
+import uuid
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from settings import ANALYSIS_CHUNK_SIZE, OFFICIAL_SOURCE
+from config import db
+from stats import raw_source
+from log import logger
+
+# NOTE: analysis queries
+# filters, column selection and group-bys run in postgres; rows come back through a server-side (named)
+# cursor ANALYSIS_CHUNK_SIZE at a time, so memory depends on the chunk size and not on the history length
+# every function returns a DataFrame, or an iterator of DataFrames when chunksize is given, e.g.
+#   from analysis import latest_snapshot, rent_stats
+#   today = latest_snapshot(columns=['apartment', 'beds', 'rent'])
+#   for chunk in snapshots_between('2024-01-01', '2024-06-30', chunksize=100000): ...
+# load_history() keeps the whole history in memory instead, with categorical strings and float32 numbers
+# rows of the buildings' own websites and of aggregators share apartment names and differ by source; every query
+# reads the official rows unless sources says otherwise, e.g. rent_stats(by=['source', 'apartment'], sources=None)
+
+SNAPSHOT_COLUMNS = ['apartment', 'plan', 'unit', 'bedrooms', 'beds', 'baths', 'sqft', 'rent', 'available_date',
+                    'retrieved', 'source']
+GROUP_COLUMNS = ['apartment', 'beds', 'retrieved_date', 'source']
+DEFAULT_SOURCES = (OFFICIAL_SOURCE,)
+# in-memory types of the history frame: the few distinct names repeat on every row, beds and baths are
+# halves, sqft and rent whole numbers well within float32's exact range
+HISTORY_DTYPES = {
+    'apartment': 'category',
+    'plan': 'category',
+    'unit': 'category',
+    'bedrooms': 'category',
+    'beds': 'float32',
+    'baths': 'float32',
+    'sqft': 'float32',
+    'rent': 'float32',
+    'available_date': 'datetime64[ns]',
+    'retrieved': 'datetime64[ns]',
+    'fingerprint': 'category',
+    'source': 'category',
+}
+# derived from another column, e.g. the partition column of the parquet dataset
+REDUNDANT_COLUMNS = ['retrieved_date']
+
+
+def _check_columns(columns, allowed):
+    # column names are formatted into the sql, so only known ones are accepted
+    unknown = [column for column in columns if column not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown columns {unknown}, choose from {allowed}")
+    return list(columns)
+
+
+def _stream(query, params, chunksize):
+    with db.connection() as conn:
+        with conn.cursor(name=f'analysis_{uuid.uuid4().hex}') as cursor:
+            cursor.itersize = chunksize
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunksize)
+                if not rows:
+                    break
+                yield pd.DataFrame(rows, columns=[column.name for column in cursor.description])
+
+
+def run_query(query, params=None, chunksize=None):
+    """Run a SELECT on a server-side cursor, return a DataFrame or an iterator of chunks if chunksize is given."""
+    if chunksize:
+        return _stream(query, params, chunksize)
+    chunks = list(_stream(query, params, ANALYSIS_CHUNK_SIZE))
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
+
+
+def memory_usage(df):
+    """Bytes held by df, strings included."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def compact(df):
+    """Return df with the HISTORY_DTYPES types and without REDUNDANT_COLUMNS, e.g. for a frame read from parquet."""
+    df = df.drop(columns=[column for column in REDUNDANT_COLUMNS if column in df.columns])
+    columns = {}
+    for column, dtype in HISTORY_DTYPES.items():
+        if column not in df.columns:
+            continue
+        if dtype.startswith('datetime64'):
+            # psycopg2 returns DATE columns as datetime.date objects
+            columns[column] = pd.to_datetime(df[column]).astype(dtype)
+        else:
+            columns[column] = df[column].astype(dtype)
+    return df.assign(**columns)
+
+
+def _concat_compact(chunks):
+    """Concatenate compacted chunks, keeping categoricals whose chunks saw different categories."""
+    if len(chunks) == 1:
+        return chunks[0].reset_index(drop=True)
+    columns = {}
+    for column in chunks[0].columns:
+        if isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+            columns[column] = union_categoricals([chunk[column] for chunk in chunks])
+        else:
+            columns[column] = pd.concat([chunk[column] for chunk in chunks], ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def _apartment_filter(apartments, params, column='apartment'):
+    if not apartments:
+        return ''
+    params['apartments'] = list(apartments)
+    return f' AND {column} = ANY(%(apartments)s)'
+
+
+def _source_filter(sources, params, column='source'):
+    # None reads every source
+    if not sources:
+        return ''
+    params['sources'] = list(sources)
+    return f' AND {column} = ANY(%(sources)s)'
+
+
+def latest_snapshot(apartments=None, columns=SNAPSHOT_COLUMNS, chunksize=None, sources=DEFAULT_SOURCES):
+    """Rows of the most recent scrape of every apartment, per source."""
+    columns = _check_columns(columns, SNAPSHOT_COLUMNS)
+    params = {}
+    where = _apartment_filter(apartments, params) + _source_filter(sources, params)
+    query = f"""
+    SELECT {', '.join(f's.{column}' for column in columns)}
+    FROM {raw_source()} s
+    JOIN (SELECT apartment, source, max(retrieved) AS retrieved FROM {raw_source()} WHERE TRUE{where}
+          GROUP BY apartment, source) l
+      ON s.apartment = l.apartment AND s.source = l.source AND s.retrieved = l.retrieved
+    ORDER BY s.apartment, s.source, s.beds, s.unit
+    """
+    return run_query(query, params, chunksize)
+
+
+def snapshots_between(start, end, apartments=None, columns=SNAPSHOT_COLUMNS, chunksize=None,
+                      sources=DEFAULT_SOURCES):
+    """Rows scraped from start to end (dates, both included); only the matching partitions are read."""
+    columns = _check_columns(columns, SNAPSHOT_COLUMNS)
+    params = {'start': pd.Timestamp(start).normalize(), 'end': pd.Timestamp(end).normalize() + pd.Timedelta(days=1)}
+    where = _apartment_filter(apartments, params) + _source_filter(sources, params)
+    query = f"""
+    SELECT {', '.join(columns)}
+    FROM {raw_source()}
+    WHERE retrieved >= %(start)s AND retrieved < %(end)s{where}
+    ORDER BY retrieved, apartment
+    """
+    return run_query(query, params, chunksize)
+
+
+def load_history(start=None, end=None, apartments=None, columns=SNAPSHOT_COLUMNS, chunksize=ANALYSIS_CHUNK_SIZE,
+                 sources=DEFAULT_SOURCES):
+    """
+    Every stored row (or the ones scraped from start to end) as one compact frame, see HISTORY_DTYPES.
+    Chunks are compacted as they arrive, so the object strings of only one chunk are in memory at a time.
+    The size before and after compacting is logged and kept in df.attrs['memory'].
+    """
+    columns = _check_columns(columns, SNAPSHOT_COLUMNS)
+    params = {}
+    where = 'WHERE TRUE'
+    if start is not None:
+        params['start'] = pd.Timestamp(start).normalize()
+        where += ' AND retrieved >= %(start)s'
+    if end is not None:
+        params['end'] = pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+        where += ' AND retrieved < %(end)s'
+    where += _apartment_filter(apartments, params) + _source_filter(sources, params)
+    query = f"""
+    SELECT {', '.join(columns)}
+    FROM {raw_source()}
+    {where}
+    ORDER BY retrieved, apartment
+    """
+
+    raw_bytes = 0
+    chunks = []
+    for chunk in run_query(query, params, chunksize):
+        raw_bytes += memory_usage(chunk)
+        chunks.append(compact(chunk))
+    df = _concat_compact(chunks) if chunks else compact(pd.DataFrame(columns=columns))
+
+    compact_bytes = memory_usage(df)
+    df.attrs['memory'] = {'raw_bytes': raw_bytes, 'compact_bytes': compact_bytes}
+    logger.info(
+        f"Loaded {len(df)} rows: {raw_bytes / 2 ** 20:.1f} MiB as queried, {compact_bytes / 2 ** 20:.1f} MiB compacted"
+        + (f" ({raw_bytes / compact_bytes:.1f}x smaller)" if compact_bytes else '')
+    )
+    return df
+
+
+def _stats_filter(start, end, apartments, sources, params):
+    where = 'WHERE TRUE'
+    if start is not None:
+        params['start'] = pd.Timestamp(start).date()
+        where += ' AND retrieved_date >= %(start)s'
+    if end is not None:
+        params['end'] = pd.Timestamp(end).date()
+        where += ' AND retrieved_date <= %(end)s'
+    return where + _apartment_filter(apartments, params) + _source_filter(sources, params)
+
+
+def unit_counts(by=('retrieved_date', 'apartment', 'beds'), start=None, end=None, apartments=None,
+                sources=DEFAULT_SOURCES):
+    """Number of listed units per group, from the daily aggregates."""
+    by = _check_columns(by, GROUP_COLUMNS)
+    params = {}
+    query = f"""
+    SELECT {', '.join(by + [''])}sum(units) AS units
+    FROM daily_availability_stats
+    {_stats_filter(start, end, apartments, sources, params)}
+    {f"GROUP BY {', '.join(by)} ORDER BY {', '.join(by)}" if by else ''}
+    """
+    return run_query(query, params)
+
+
+def rent_stats(by=('apartment', 'beds'), start=None, end=None, apartments=None, sources=DEFAULT_SOURCES):
+    """Mean, min and max rent and mean rent per sqft per group, from the daily aggregates."""
+    by = _check_columns(by, GROUP_COLUMNS)
+    params = {}
+    query = f"""
+    SELECT {', '.join(by + [''])}
+           sum(rent_sum) / NULLIF(sum(rent_units), 0) AS mean_rent,
+           min(rent_min) AS min_rent,
+           max(rent_max) AS max_rent,
+           sum(rent_per_sqft_sum) / NULLIF(sum(rent_per_sqft_units), 0) AS mean_rent_per_sqft,
+           sum(units) AS units
+    FROM daily_availability_stats
+    {_stats_filter(start, end, apartments, sources, params)}
+    {f"GROUP BY {', '.join(by)} ORDER BY {', '.join(by)}" if by else ''}
+    """
+    return run_query(query, params)
+
+
+def median_rent(by=('apartment', 'beds'), start=None, end=None, apartments=None, sources=DEFAULT_SOURCES):
+    """Median rent per group; medians can't be summed up, so this one is computed from the raw rows in postgres."""
+    by = _check_columns(by, GROUP_COLUMNS)
+    group = [column if column != 'retrieved_date' else 'retrieved::date' for column in by]
+    params = {}
+    where = 'WHERE rent IS NOT NULL'
+    if start is not None:
+        params['start'] = pd.Timestamp(start).normalize()
+        where += ' AND retrieved >= %(start)s'
+    if end is not None:
+        params['end'] = pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+        where += ' AND retrieved < %(end)s'
+    where += _apartment_filter(apartments, params) + _source_filter(sources, params)
+    query = f"""
+    SELECT {', '.join([f'{g} AS {c}' for g, c in zip(group, by)] + [''])}
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY rent) AS median_rent
+    FROM {raw_source()}
+    {where}
+    {f"GROUP BY {', '.join(group)} ORDER BY {', '.join(group)}" if by else ''}
+    """
+    return run_query(query, params)
+
+
+def available_within(days=5, on=None, apartments=None, by=('apartment', 'beds'), sources=DEFAULT_SOURCES):
+    """Units in the latest scrape (or the scrapes of date on) that are available within days."""
+    by = _check_columns(by, ['apartment', 'beds', 'source'])
+    params = {'days': days}
+    if on is None:
+        source = f"""(SELECT s.* FROM {raw_source()} s
+                     JOIN (SELECT apartment, source, max(retrieved) AS retrieved FROM {raw_source()}
+                           GROUP BY apartment, source) l
+                       ON s.apartment = l.apartment AND s.source = l.source AND s.retrieved = l.retrieved) latest"""
+        params['on'] = pd.Timestamp.now().normalize()
+        where = 'WHERE TRUE'
+    else:
+        source = raw_source()
+        params['on'] = pd.Timestamp(on).normalize()
+        where = "WHERE retrieved >= %(on)s AND retrieved < %(on)s + interval '1 day'"
+    where += (" AND available_date <= %(on)s::date + %(days)s" + _apartment_filter(apartments, params)
+              + _source_filter(sources, params))
+    query = f"""
+    SELECT {', '.join(by + [''])}count(*) AS units
+    FROM {source}
+    {where}
+    {f"GROUP BY {', '.join(by)} ORDER BY {', '.join(by)}" if by else ''}
+    """
+    return run_query(query, params)
@@ -0,0 +1,133 @@
+import json
+import argparse
+
+import pandas as pd
+
+from settings import AGGREGATOR_SOURCE, AGGREGATOR_CHUNK
+from apartments_com.apt_com import APT_INFO_LIST
+from fetcher import fetch_page
+from extract import parse_html, xpath, class_xpath, inner_text
+from crawler import crawl_details
+from driver_pool import driver_pool
+from pipeline import Pipeline, ParquetSink, default_sinks
+from normalize import normalize, text, number
+from metrics import metrics
+from log import logger
+
+# NOTE: apartments.com aggregator
+# one listing page per building in APT_INFO_LIST (or any list of {'name', 'url', 'apartment'}), fetched on the shared
+# headless driver pool; the buildings are crawled like detail pages, so they share the worker budget, the
+# per-host limit and the per-host pacing of HOST_INTERVAL instead of sleeping a fixed time between them
+# rows go through the pipeline into availabilities with source = AGGREGATOR_SOURCE, under the building's
+# apartment name (its name if it has none), the one its official spider uses, so the two sources line up
+#   python -m apartments_com.aggregator
+#   python -m apartments_com.aggregator --buildings buildings.json --no-insert
+
+UNITS_XPATH = "//div[@data-tab-content-id='all']"
+ALL_UNITS_TAB = xpath(UNITS_XPATH)
+UNITS = xpath(class_xpath('unitContainer', scope=class_xpath('hasUnitGrid', scope='.//') + '//', tag='li'))
+SQFT = xpath(class_xpath('sqftColumn', tag='div') + '//span[2]')
+# the span's own text, without its visually hidden 'availability' label
+AVAILABLE = xpath(class_xpath('dateAvailable', tag='span') + '/text()')
+
+FIELD_RULES = {
+    'Bedrooms': text(source='Beds'),
+    'Beds': number(),
+    'Baths': number(),
+    'Sq_ft': number(),
+    'Rent': number(),
+    'Availability': text(),
+}
+AVAILABLE_NOW = ['Now', 'Available Now']
+
+
+@metrics.timed('parse')
+def parse_building(html):
+    """Read every unit of a building's listing page, the same fields the browser script of fetching_apt_com reads."""
+    data = []
+    for unit in [unit for tab in ALL_UNITS_TAB(parse_html(html)) for unit in UNITS(tab)]:
+        sq_ft = SQFT(unit)
+        available = ' '.join(''.join(AVAILABLE(unit)).split())
+        data.append({
+            'Plan': unit.get('data-model'),
+            'Unit': unit.get('data-unit'),
+            'Rent': unit.get('data-maxrent'),
+            'Beds': unit.get('data-beds'),
+            'Baths': unit.get('data-baths'),
+            'Sq_ft': inner_text(sq_ft[0]) if sq_ft else None,
+            'Availability': available or None,
+        })
+    return pd.DataFrame(data, columns=['Plan', 'Unit', 'Rent', 'Beds', 'Baths', 'Sq_ft', 'Availability'])
+
+
+def fetch_building(url):
+    return fetch_page('apartments_com', url, UNITS_XPATH, parse_building)
+
+
+def available_dates(values, now):
+    """
+    apartments.com leaves the year out ('Jun 15'), such dates are taken as the first one on or after a month ago.
+    'Now' is the date of now, anything else is parsed as a full date.
+    """
+    values = pd.Series(values, dtype=object)
+    now = pd.Timestamp(now).normalize()
+    dates = pd.to_datetime(values, format='%b %d', errors='coerce')
+    yearless = dates.notna()
+    if yearless.any():
+        dates[yearless] = pd.to_datetime({'year': now.year, 'month': dates[yearless].dt.month,
+                                          'day': dates[yearless].dt.day}, errors='coerce')
+        dates[yearless] = dates[yearless].where(dates[yearless] >= now - pd.DateOffset(months=1),
+                                                dates[yearless] + pd.DateOffset(years=1))
+    rest = dates.isna() & values.notna()
+    if rest.any():
+        dates[rest] = pd.to_datetime(values[rest], format='mixed', errors='coerce')
+    dates[values.isin(AVAILABLE_NOW)] = now
+    return dates
+
+
+def clean_data(df, retrieved):
+    df['Apartment'] = df.pop('Building')
+    df['Retrieved'] = retrieved
+    df['Source'] = AGGREGATOR_SOURCE
+
+    df = normalize(df, FIELD_RULES, now=retrieved)
+    df['Availability'] = available_dates(df['Availability'], retrieved)
+
+    df = df[['Apartment', 'Plan', 'Unit', 'Bedrooms', 'Beds', 'Baths', 'Sq_ft', 'Rent', 'Availability', 'Retrieved',
+             'Source']]
+
+    return df
+
+
+def iter_buildings(buildings):
+    """Yield the units of every building, AGGREGATOR_CHUNK buildings are fetched in parallel at a time."""
+    buildings = list(buildings)
+    for start in range(0, len(buildings), AGGREGATOR_CHUNK):
+        chunk = buildings[start:start + AGGREGATOR_CHUNK]
+        names = {building['url']: building.get('apartment', building['name']) for building in chunk}
+        for result in crawl_details(list(names), fetch_building):
+            if result.value is None:
+                continue
+            logger.info(f"{names[result.link]}: {len(result.value)} units on apartments.com")
+            yield result.value.assign(Building=names[result.link])
+
+
+def get_aggregator_listings(buildings=APT_INFO_LIST, insert=True, sinks=()):
+    """Scrape the buildings' apartments.com pages and write their rows to the sinks (and the database if insert)."""
+    pipeline = Pipeline('apartments_com', clean_data, default_sinks(insert, sinks))
+    return pipeline.run(iter_buildings(buildings))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scrape building listings from apartments.com')
+    parser.add_argument('--buildings', help='json file with a list of {"name": ..., "url": ..., "apartment": ...}, '
+                                            'APT_INFO_LIST by default')
+    parser.add_argument('--no-insert', action='store_true', help="don't insert into the database")
+    args = parser.parse_args()
+
+    buildings = APT_INFO_LIST
+    if args.buildings:
+        with open(args.buildings, encoding='utf-8') as f:
+            buildings = json.load(f)
+    get_aggregator_listings(buildings, insert=not args.no_insert, sinks=[ParquetSink()])
+    driver_pool.log_stats()
@@ -1,67 +1,83 @@
-# from apartments.com
+# from apartments.com; apartment is the name the official spiders store the building under
 APT_INFO_LIST = [
     {
         'name': 'cooper', 
+        'apartment': 'The Cooper',
         'url': 'https://www.apartments.com/the-cooper-chicago-il/08xcdh0/'
         },
     {
         'name': 'reed', 
+        'apartment': 'Reed',
         'url': 'https://www.apartments.com/the-reed-chicago-il/10mm7q5/'
     },
     {
         'name': 'elle', 
+        'apartment': 'ELLE',
         'url': 'https://www.apartments.com/the-elle-apartments-chicago-il/gbwbhpx/'
     },
     {
         'name': 'amli900', 
+        'apartment': 'AMLI 900',
         'url': 'https://www.apartments.com/amli-900-chicago-il/d1sf1sl/'
     },
     {
         'name': 'grand_central', 
+        'apartment': 'Grand Central',
         'url': 'https://www.apartments.com/the-grand-central-chicago-il/8440312/'
     },
     {
         'name': 'sentral', 
+        'apartment': 'Sentral Michigan Avenue',
         'url': 'https://www.apartments.com/sentral-michigan-avenue-chicago-il/begd58b/'
     },
     {
         'name': 'nema', 
+        'apartment': 'NEMA Chicago',
         'url': 'https://www.apartments.com/nema-chicago-chicago-il/vtgrsgd/'
     },
     {
         'name': 'eleven30', 
+        'apartment': 'Eleven 30',
         'url': 'https://www.apartments.com/eleven-thirty-chicago-il/y9fmn4v/'
     },
     {
         'name': 'eleven40', 
+        'apartment': 'Eleven 40',
         'url': 'https://www.apartments.com/eleven40-chicago-il/dsspjlk/'
     },
     {
         'name': '1000m', 
+        'apartment': '1000M',
         'url': 'https://www.apartments.com/1000m-chicago-il/klm1wdb/'
     },
     {
         'name': 'arrive', 
+        'apartment': 'Arrive Michigan Avenue',
         'url': 'https://www.apartments.com/arrive-michigan-avenue-chicago-il/fwt450t/'
     },
     {
         'name': '1001',
+        'apartment': '1001 South State',
         'url': 'https://www.apartments.com/1001-south-state-chicago-il/hlbgn40/'
     },
     {
         'name': 'century_tower',
+        'apartment': 'Century Tower',
         'url': 'https://www.apartments.com/century-tower-chicago-il/rqkkv83/'
     },
     {
         'name': 'linea',
+        'apartment': 'LINEA',
         'url': 'https://www.apartments.com/linea-apartments-chicago-il/rklm500/'
     },
     {
         'name': 'marquee_at_block',
+        'apartment': 'Marquee at Block 37',
         'url': 'https://www.apartments.com/marquee-at-block-37-chicago-il/ddcdlyh/'
     },
     {
         'name': 'parkline',
+        'apartment': 'Parkline Chicago',
         'url': 'https://www.apartments.com/parkline-chicago-chicago-il/3zg8bwg/'
     }
 ]
\ No newline at end of file
@@ -5,7 +5,29 @@ from webdriver_manager.chrome import ChromeDriverManager
 import pandas as pd
 import time
 
-from apartments.apartments_com.apt_com import APT_INFO_LIST
+from apartments_com.apt_com import APT_INFO_LIST
+from driver_pool import count_commands
+from log import logger
+
+# every unit field used to be its own webdriver call (5 get_attribute + 2 find_element/.text per unit),
+# this script reads all of them in the browser and returns them as one JSON list
+UNITS_SCRIPT = """
+const text = (unit, selector) => {
+    const element = unit.querySelector(selector);
+    return element ? element.innerText : null;
+};
+return Array.from(document.querySelectorAll("div[data-tab-content-id='all'] .hasUnitGrid li.unitContainer"))
+    .map(unit => ({
+        model: unit.getAttribute('data-model'),
+        unit_number: unit.getAttribute('data-unit'),
+        price: unit.getAttribute('data-maxrent'),
+        beds: unit.getAttribute('data-beds'),
+        baths: unit.getAttribute('data-baths'),
+        sq_ft: text(unit, 'div.sqftColumn span:nth-of-type(2)'),
+        availability: text(unit, 'span.dateAvailable'),
+    }));
+"""
+COLUMNS = ['model', 'unit_number', 'price', 'beds', 'baths', 'sq_ft', 'availability']
 
 def setup_driver(headless=False):
     options = webdriver.ChromeOptions()
@@ -16,31 +38,16 @@ def setup_driver(headless=False):
     return driver
 
 def scrape_apartments(apt_info):
-    driver = setup_driver(headless=False)
+    commands = []
+    driver = count_commands(setup_driver(headless=False), commands.append)
     driver.get(apt_info['url'])
 
     try:
-        div_element = driver.find_element(By.CSS_SELECTOR, "div[data-tab-content-id='all']")
-        sections = div_element.find_elements(By.CLASS_NAME, 'hasUnitGrid')
-        print(f"Found {len(sections)} sections with units.")
-
-        columns = ['model', 'unit_number', 'price', 'beds', 'baths', 'sq_ft', 'availability']
-        df = pd.DataFrame(columns=columns)
-
-        for section in sections:
-            units = section.find_elements(By.CSS_SELECTOR, 'li.unitContainer')
-            for unit in units:
-                data = {
-                    'model': unit.get_attribute('data-model'),
-                    'unit_number': unit.get_attribute('data-unit'),
-                    'price': unit.get_attribute('data-maxrent'),
-                    'beds': unit.get_attribute('data-beds'),
-                    'baths': unit.get_attribute('data-baths'),
-                    'sq_ft': unit.find_element(By.CSS_SELECTOR, 'div.sqftColumn span:nth-of-type(2)').text,
-                    'availability': unit.find_element(By.CSS_SELECTOR, 'span.dateAvailable').text#.split('\n')[-1]
-                }
-                df = pd.concat([df, pd.DataFrame([data])], ignore_index=True)
+        driver.find_element(By.CSS_SELECTOR, "div[data-tab-content-id='all']")
+        units = driver.execute_script(UNITS_SCRIPT)
+        print(f"Found {len(units)} units.")
 
+        df = pd.DataFrame(units, columns=COLUMNS)
         file_name = apt_info['name'] + '.csv'
         df.to_csv(f'./output/apts/{file_name}', index=False)
         print(f"Data saved to {file_name}")
@@ -49,6 +56,7 @@ def scrape_apartments(apt_info):
         print(f"An error occurred: {e}")
 
     finally:
+        logger.info(f"{apt_info['name']}: {len(commands)} webdriver commands")
         driver.quit()
 
 
@@ -0,0 +1,125 @@
+import os
+import gzip
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+from settings import ARCHIVE_DIR, ARCHIVE_PAGES
+from log import logger
+
+# NOTE: record-and-replay page archive
+# every fetched page is stored gzip-compressed under objects/ by the sha256 of its html, so a page that
+# doesn't change between runs is stored once; runs/<run_id>.jsonl lists which page each (site, url) got
+# refs/ points each (site, url) to the last page recorded for it, so a page that was not fetched again
+# (e.g. an unchanged unit in incremental mode) can be carried into the new run
+# in replay mode the spiders read pages from a recorded run instead of the network or the browser
+
+RUN_ID_FORMAT = '%Y%m%d-%H%M%S'
+
+
+class PageArchive(object):
+
+    def __init__(self, root=ARCHIVE_DIR, enabled=ARCHIVE_PAGES):
+        self.root = root
+        self.enabled = enabled
+        self.started = datetime.now()
+        self.run_id = self.started.strftime(RUN_ID_FORMAT)
+        self.replay_run = None
+        self._replay_index = {}
+        self._lock = threading.Lock()
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], f'{digest}.html.gz')
+
+    def _manifest_path(self, run_id):
+        return os.path.join(self.root, 'runs', f'{run_id}.jsonl')
+
+    def _ref_path(self, site, url):
+        key = hashlib.sha256(f'{site} {url}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, 'refs', key[:2], key)
+
+    def _add_to_run(self, site, url, digest):
+        entry = {'site': site, 'url': url, 'digest': digest, 'fetched': datetime.now().isoformat()}
+        with self._lock:
+            os.makedirs(os.path.dirname(self._manifest_path(self.run_id)), exist_ok=True)
+            with open(self._manifest_path(self.run_id), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def record(self, site, url, html):
+        """Store a fetched page for the current run, does nothing while replaying."""
+        if not self.enabled or self.replay_run or html is None:
+            return
+        digest = hashlib.sha256(html.encode('utf-8')).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                f.write(html)
+            os.replace(tmp_path, path)
+
+        ref_path = self._ref_path(site, url)
+        os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+        with open(ref_path, 'w', encoding='utf-8') as f:
+            f.write(digest)
+        self._add_to_run(site, url, digest)
+
+    def carry_forward(self, site, url):
+        """Add the last recorded page of (site, url) to the current run without fetching it again."""
+        if not self.enabled or self.replay_run or not url:
+            return
+        try:
+            with open(self._ref_path(site, url), encoding='utf-8') as f:
+                digest = f.read().strip()
+        except OSError:
+            return
+        self._add_to_run(site, url, digest)
+
+    def runs(self):
+        """Return the ids of all recorded runs, oldest first."""
+        runs_dir = os.path.join(self.root, 'runs')
+        if not os.path.isdir(runs_dir):
+            return []
+        return sorted(name[:-len('.jsonl')] for name in os.listdir(runs_dir) if name.endswith('.jsonl'))
+
+    def start_replay(self, run_id):
+        """Serve pages from a recorded run from now on, the run's start time becomes the scrape time."""
+        index = {}
+        with open(self._manifest_path(run_id), encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                index[(entry['site'], entry['url'])] = entry['digest']
+        self.replay_run = run_id
+        self._replay_index = index
+        logger.info(f"Replaying run {run_id} with {len(index)} archived pages")
+
+    def stop_replay(self):
+        self.replay_run = None
+        self._replay_index = {}
+
+    def replay_sites(self):
+        """Sites that have pages in the replayed run."""
+        return {site for site, _ in self._replay_index}
+
+    @property
+    def replaying(self):
+        return self.replay_run is not None
+
+    def lookup(self, site, url):
+        """Return the archived html of a page in the replayed run."""
+        digest = self._replay_index.get((site, url))
+        if digest is None:
+            raise KeyError(f"{site} page {url} is not in archived run {self.replay_run}")
+        with gzip.open(self._object_path(digest), 'rt', encoding='utf-8') as f:
+            return f.read()
+
+    def now(self):
+        """Scrape time: the current time, or the start of the replayed run."""
+        import pandas as pd
+        if self.replay_run:
+            return pd.Timestamp(datetime.strptime(self.replay_run, RUN_ID_FORMAT))
+        return pd.Timestamp.now()
+
+
+archive = PageArchive()
@@ -0,0 +1,117 @@
+"""
+Insert benchmark: the old row-by-row INSERT against the bulk paths of utils.insert_data.
+
+legacy: iterrows + one cursor.execute per row, one commit at the end (the previous insert_data)
+values: execute_values multi-row INSERTs, one transaction per batch
+copy:   COPY FROM STDIN, one transaction per batch
+
+Rows are synthetic spider output written to a temporary copy of availabilities, so the benchmark needs a
+database with the schema from scripts.sql but leaves its data alone.
+
+usage (from the project root):
+    python -m benchmarks.bench_insert [--sizes 1000,100000,1000000] [--legacy-max 100000] [--json]
+"""
+import sys
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import db
+from utils import insert_data
+
+TABLE = 'availabilities_bench'
+
+
+def make_rows(n, seed=0):
+    """Synthetic cleaned spider output with the same columns and dtypes as clean_data returns."""
+    rng = np.random.default_rng(seed)
+    beds = rng.integers(0, 4, n)
+    return pd.DataFrame({
+        'Apartment': rng.choice(['1000M', 'Eleven 30', 'Eleven 40', 'ELLE', 'Grand Central', 'LINEA'], n),
+        'Plan': pd.Series(rng.integers(1, 40, n)).map(lambda i: f'Plan {i}'),
+        'Unit': pd.Series(rng.integers(100, 9999, n)).astype(str),
+        'Bedrooms': pd.Series(beds).map(lambda b: 'Studio' if b == 0 else f'{b} Bed'),
+        'Beds': beds.astype(float),
+        'Baths': rng.choice([1.0, 1.5, 2.0], n),
+        'Sq_ft': rng.integers(400, 1600, n).astype(float),
+        'Rent': pd.Series(rng.integers(1500, 6000, n)).astype(str),
+        'Availability': pd.Timestamp('2024-06-01') + pd.to_timedelta(rng.integers(0, 90, n), unit='D'),
+        'Retrieved': pd.Timestamp('2024-05-30 12:00:00'),
+        'Fingerprint': [f'{i:040x}' for i in range(n)],
+    })
+
+
+def legacy_insert(conn, data):
+    """The previous insert_data: one INSERT round trip per row."""
+    insert_query = f"""
+    INSERT INTO {TABLE} (apartment, plan, unit, bedrooms, beds, baths, sqft, rent, available_date, retrieved,
+                         fingerprint)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+    """
+    cursor = conn.cursor()
+    for _, row in data.iterrows():
+        cursor.execute(insert_query, (
+            row['Apartment'], row['Plan'], row['Unit'],
+            row['Bedrooms'], row['Beds'], row['Baths'],
+            row['Sq_ft'], row['Rent'], row['Availability'],
+            row['Retrieved'], row['Fingerprint']
+        ))
+    conn.commit()
+    cursor.close()
+
+
+def reset_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE availabilities INCLUDING DEFAULTS)')
+    conn.commit()
+
+
+def time_method(conn, method, data):
+    reset_table(conn)
+    start = time.perf_counter()
+    if method == 'legacy':
+        legacy_insert(conn, data)
+    else:
+        insert_data(conn, data, table=TABLE, method=method)
+    return time.perf_counter() - start
+
+
+def main():
+    sizes = [1000, 100000, 1000000]
+    if '--sizes' in sys.argv:
+        sizes = [int(size) for size in sys.argv[sys.argv.index('--sizes') + 1].split(',')]
+    # row-by-row inserts of a million rows take far too long to be worth waiting for
+    legacy_max = int(sys.argv[sys.argv.index('--legacy-max') + 1]) if '--legacy-max' in sys.argv else 100000
+
+    results = {}
+    with db.connection() as conn:
+        try:
+            for size in sizes:
+                data = make_rows(size)
+                results[size] = {}
+                for method in ['legacy', 'values', 'copy']:
+                    if method == 'legacy' and size > legacy_max:
+                        continue
+                    seconds = time_method(conn, method, data)
+                    results[size][method] = {'seconds': seconds, 'rows_per_sec': size / seconds}
+        finally:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+            conn.commit()
+
+    if '--json' in sys.argv:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'rows':>10}{'legacy (s)':>14}{'values (s)':>14}{'copy (s)':>12}{'copy rows/s':>14}")
+    for size, timings in results.items():
+        cells = [f"{timings[m]['seconds']:.2f}" if m in timings else '-' for m in ['legacy', 'values', 'copy']]
+        print(f"{size:>10}{cells[0]:>14}{cells[1]:>14}{cells[2]:>12}{timings['copy']['rows_per_sec']:>14,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Normalization benchmark: the old clean_data str.replace chains against normalize.py rules.
+
+Frames are synthetic raw listing tables in the shape the 1000M, Eleven 30 and RentCafe (ELLE, Grand Central,
+Eleven 40) spiders scrape. The old chains are kept here as they were; both results are compared column by
+column after converting the old strings to numbers and dates.
+
+usage (from the project root):
+    python -m benchmarks.bench_normalize [--sizes 10000,100000,1000000] [--json]
+"""
+import sys
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from normalize import normalize
+from spider import list_1000m, list_1130, list_elle
+
+NOW = pd.Timestamp('2024-05-30 12:00:00')
+
+
+def raw_1000m(n, rng):
+    return pd.DataFrame({
+        'Unit': [f'Apt #: {u}' for u in rng.integers(100, 3000, n)],
+        'Plan': rng.choice([f'Floor Plan: {p}' for p in ['A1', 'A2', 'B1', 'B2', 'S1', 'C1']], n),
+        'Beds': rng.choice(['Beds: 1 Bed', 'Beds: 2 Bed', 'Beds: Studio', 'Beds: 1 Bed + Den', 'Beds: Convertible'], n),
+        'Baths': rng.choice(['Baths: 1 Bath', 'Baths: 2 Bath', 'Baths: 1.5 Bath'], n),
+        'Sq_ft': [f'Size: {s:,} sf' for s in rng.integers(450, 1600, n)],
+        'Rent': [f'Price: ${r:,}' for r in rng.integers(1500, 6000, n)],
+        'Availability': rng.choice(['Available: Now'] + [f'Available: {m}/{d}/2024' for m in (6, 7) for d in range(1, 29)], n),
+    })
+
+
+def legacy_1000m(df):
+    df = df.copy()
+    df['Unit'] = df['Unit'].str.replace('Apt #:', '').str.strip()
+    df['Plan'] = df['Plan'].str.replace('Floor Plan:', '').str.strip()
+    df['Bedrooms'] = df['Beds'].str.replace('Beds:', '').str.replace('Bed', '').str.strip()
+    df['Beds'] = df['Bedrooms']
+    df.loc[df['Bedrooms'].str.contains('Studio|Convertible'), 'Beds'] = 0
+    df.loc[df['Bedrooms'].str.contains('Den'), 'Beds'] = 1.5
+    df['Baths'] = df['Baths'].str.replace('Baths:', '').str.replace('Bath', '').str.strip()
+    df['Sq_ft'] = df['Sq_ft'].str.replace('Size:', '').str.replace(',', '').str.replace('sf', '').str.strip()
+    df['Rent'] = df['Rent'].str.replace('Price:', '').str.replace('$', '').str.replace(',', '').str.strip()
+    df['Availability'] = df['Availability'].str.replace('Available:', '').str.strip()
+    df.loc[df['Availability'].str.contains('Now'), 'Availability'] = NOW.date()
+    df['Availability'] = pd.to_datetime(df['Availability'])
+    return df
+
+
+def raw_1130(n, rng):
+    return pd.DataFrame({
+        'Plan': rng.choice(['A1 (1BR/1BA)', 'B2 (2BR/2BA)', 'S1 (Studio)', 'C1 (3BR/2BA)'], n),
+        'Unit': rng.integers(100, 3000, n).astype(str),
+        'Sq_ft': rng.integers(450, 1600, n).astype(str),
+        'Rent': rng.integers(1500, 6000, n).astype(str),
+        'Availability': rng.choice(['Now', '06/01/2024', '07/15/2024'], n),
+    })
+
+
+def legacy_1130(df):
+    df = df.copy()
+    df['rooms'] = df['Plan'].apply(lambda x: x.split(' ')[-1])
+    df['rooms'] = df['rooms'].str.replace('(', '').str.replace(')', '')
+    df['Bedrooms'] = df['rooms'].apply(lambda x: x.split('/')[0])
+    df['Beds'] = df['Bedrooms'].str.replace('BR', '').str.strip()
+    df['Beds'] = df['Beds'].apply(lambda x: 0 if x == 'Studio' else x)
+    df['Baths'] = df['rooms'].apply(lambda x: x.split('/')[-1])
+    df['Baths'] = df['Baths'].str.replace('BA', '').str.strip()
+    df['Baths'] = df['Baths'].apply(lambda x: 1 if x == 'Studio' else x)
+    df.loc[df['Availability'].str.contains('Now'), 'Availability'] = NOW.date()
+    df['Availability'] = pd.to_datetime(df['Availability'])
+    return df
+
+
+def raw_rentcafe(n, rng):
+    return pd.DataFrame({
+        'Unit': [f'Apartment: #{u}' for u in rng.integers(100, 3000, n)],
+        'Sq_ft': [f'{s:,}' for s in rng.integers(450, 1600, n)],
+        'Bedrooms': rng.choice(['1 Bedroom', '2 Bedrooms', 'Studio'], n),
+        'Baths': rng.choice(['1 Bathroom', '2 Bathrooms'], n),
+        'Rent': [f'${r:,}' for r in rng.integers(1500, 6000, n)],
+        'Availability': rng.choice([f'Available: {m}/{d}/2024' for m in (6, 7) for d in range(1, 29)], n),
+    })
+
+
+def legacy_rentcafe(df):
+    df = df.copy()
+    df['Unit'] = df['Unit'].str.replace('Apartment: #', '').str.strip()
+    df['Sq_ft'] = df['Sq_ft'].str.replace('Sq. Ft.:', '').str.replace(',', '').str.strip()
+    df['Bedrooms'] = df['Bedrooms'].str.replace('Bedroom', '').str.replace('s', '').str.strip()
+    df['Beds'] = df['Bedrooms'].apply(lambda x: 0 if x == 'Studio' else x)
+    df['Baths'] = df['Baths'].str.replace('Bathroom', '').str.replace('s', '').str.strip()
+    df['Rent'] = df['Rent'].str.replace('$', '').str.replace(',', '').str.strip()
+    df['Availability'] = df['Availability'].str.replace('Available:', '').str.strip()
+    df['Availability'] = pd.to_datetime(df['Availability'])
+    return df
+
+
+CASES = {
+    '1000m': (raw_1000m, legacy_1000m, list_1000m.FIELD_RULES),
+    '1130': (raw_1130, legacy_1130, list_1130.FIELD_RULES),
+    'rentcafe': (raw_rentcafe, legacy_rentcafe, list_elle.FIELD_RULES),
+}
+
+
+def same_result(old, new, rules):
+    for column, rule in rules.items():
+        if rule.kind == 'number':
+            equal = np.allclose(pd.to_numeric(old[column]).astype(float), new[column], equal_nan=True)
+        else:
+            equal = old[column].astype(str).equals(new[column].astype(str))
+        if not equal:
+            return False
+    return True
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    sizes = [10000, 100000, 1000000]
+    if '--sizes' in sys.argv:
+        sizes = [int(size) for size in sys.argv[sys.argv.index('--sizes') + 1].split(',')]
+
+    rng = np.random.default_rng(0)
+    results = {}
+    for name, (make, legacy, rules) in CASES.items():
+        for size in sizes:
+            raw = make(size, rng)
+            old_seconds, old = timed(legacy, raw)
+            new_seconds, new = timed(normalize, raw, rules, NOW)
+            results[f'{name}/{size}'] = {
+                'old_seconds': old_seconds,
+                'new_seconds': new_seconds,
+                'speedup': old_seconds / new_seconds,
+                'same_result': same_result(old, new, rules),
+            }
+
+    if '--json' in sys.argv:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'case':<20}{'old (s)':>10}{'rules (s)':>11}{'speedup':>10}{'same':>7}")
+    for case, result in results.items():
+        print(f"{case:<20}{result['old_seconds']:>10.3f}{result['new_seconds']:>11.3f}"
+              f"{result['speedup']:>9.1f}x{str(result['same_result']):>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Page load benchmark: browser load time per site with the old and the lean page-load profile.
+
+old:  'normal' page load strategy, every resource loaded, no persistent profile
+lean: 'eager' strategy, PAGE_PROFILES resource blocking, CHROME_PROFILE_DIR disk cache if set
+
+Both measure driver.get until the spider's target element is present.
+
+usage (from the project root):
+    python -m benchmarks.bench_page_load [--repeat 3] [--json]
+"""
+import sys
+import json
+import time
+import statistics
+
+from settings import M1000_URL, LINEA_URL, ELEVEN30_URL, ELEVEN40_URL, ELLE_URL, GRAND_CENTRAL_URL, REED_URL
+from driver_pool import DriverPool
+from fetcher import browser_get
+from spider import list_1000m, list_1130, list_1140, list_elle, list_grandcentral, list_linea, list_reed
+
+SITES = {
+    '1000m': (M1000_URL, list_1000m.TABLE_XPATH),
+    'linea': (LINEA_URL, list_linea.TABLE_XPATH),
+    '1130': (ELEVEN30_URL, list_1130.FLOOR_PLAN_XPATH),
+    '1140': (ELEVEN40_URL, list_1140.FLOOR_PLAN_XPATH),
+    'elle': (ELLE_URL, list_elle.FLOOR_PLANS_XPATH),
+    'grand_central': (GRAND_CENTRAL_URL, list_grandcentral.FLOOR_PLANS_XPATH),
+    'reed': (REED_URL, list_reed.FLOOR_PLAN_XPATH),
+}
+
+
+def time_site(pool, site, url, xpath, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            browser_get(url, xpath, site=site, pool=pool)
+        except Exception as e:
+            return {'error': str(e).splitlines()[0] if str(e) else type(e).__name__}
+        timings.append(time.perf_counter() - start)
+    return {'median': statistics.median(timings), 'min': min(timings)}
+
+
+def main():
+    repeat = int(sys.argv[sys.argv.index('--repeat') + 1]) if '--repeat' in sys.argv else 3
+    pools = {
+        'old': DriverPool(max_size=1, page_load_strategy='normal', profile_dir=None, lean=False),
+        'lean': DriverPool(max_size=1),
+    }
+    results = {}
+    for name, pool in pools.items():
+        # warm up so browser startup is not counted as page load
+        with pool.lease():
+            pass
+        results[name] = {site: time_site(pool, site, url, xpath, repeat) for site, (url, xpath) in SITES.items()}
+        pool.close()
+
+    print(f"{'site':<16}{'old (s)':>10}{'lean (s)':>10}{'speedup':>10}")
+    for site in SITES:
+        old, lean = results['old'][site], results['lean'][site]
+        if 'error' in old or 'error' in lean:
+            print(f"{site:<16}  error: {old.get('error') or lean.get('error')}")
+            continue
+        print(f"{site:<16}{old['median']:>10.2f}{lean['median']:>10.2f}{old['median'] / lean['median']:>9.1f}x")
+
+    if '--json' in sys.argv:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""
+Parser benchmark: parse + clean_data throughput and peak memory of every spider template, offline.
+
+Each template has a stored page under benchmarks/fixtures; it is scaled to the requested number of units by
+copying its unit elements (table rows, list items) before parsing, so the spider's own selectors and
+clean_data run on a page of that size. Lease-based spiders get the detail values of the fixture lease page,
+the way get_all_unit_details would after fetching every lease page.
+
+parse: the spider's parse function, from html to its raw frames
+clean: detail values and fingerprints where the spider has them, then clean_data on every frame
+peak:  tracemalloc peak of parse + clean, in a separate run so tracing doesn't slow down the timed ones
+
+Compare against an earlier --json output to catch regressions; the exit status is 1 if a template got slower
+than --tolerance times its baseline rows/sec.
+
+usage (from the project root):
+    python -m benchmarks.bench_parsers [--sizes 100,1000,10000] [--repeat 3] [--sites nema,reed] [--json]
+    python -m benchmarks.bench_parsers --json > baseline.json
+    python -m benchmarks.bench_parsers --baseline baseline.json [--tolerance 1.25]
+"""
+import os
+import sys
+import copy
+import json
+import time
+import logging
+import tracemalloc
+from contextlib import redirect_stdout
+
+import pandas as pd
+from lxml import html as lxml_html
+
+from extract import class_xpath, xpath
+from incremental import fingerprint_rows
+from lease import parse_lease_page
+from spider import list_1000m, list_1130, list_1140, list_elle, list_nema, list_reed
+from apartments_com import aggregator
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+LEASE_PAGE = fixture('lease.html')
+RETRIEVED = pd.Timestamp('2026-10-18 06:00')
+
+
+def scale_rows(html, rows_xpath, size):
+    """Copy or drop the unit elements of a page until it lists size units, spread over the original ones."""
+    tree = lxml_html.document_fromstring(html)
+    rows = xpath(rows_xpath)(tree)
+    for row in rows[size:]:
+        row.getparent().remove(row)
+    for position in range(len(rows), size):
+        template = rows[position % len(rows)]
+        template.addnext(copy.deepcopy(template))
+    return lxml_html.tostring(tree, encoding='unicode')
+
+
+def with_lease_details(df):
+    """Add what get_all_unit_details adds once every lease page of the frame is fetched."""
+    availability, rent = parse_lease_page(LEASE_PAGE)
+    df['Fingerprint'] = fingerprint_rows(df)
+    df['Availability'] = availability
+    df['12_month_rent'] = rent
+    return df
+
+
+def with_rent(df):
+    """Add what get_unit_details of Eleven 30 adds once every lease information page is fetched."""
+    df['Fingerprint'] = fingerprint_rows(df)
+    df['Rent'] = '2745'
+    return df
+
+
+def clean_with(prepare, clean_data):
+    def clean(df, retrieved):
+        return clean_data(prepare(df), retrieved)
+    return clean
+
+
+def parse_lease_pages(pages):
+    return [pd.DataFrame([parse_lease_page(page) for page in pages], columns=['Availability', 'Rent'])]
+
+
+# template: (fixture, xpath of its unit elements, html -> raw frames, (raw frame, retrieved) -> clean frame)
+CASES = {
+    'nema': (
+        'nema.html', class_xpath('availabilities-list__item', scope='//', tag='div'),
+        lambda html: [list_nema.extract_data(list_nema.parse_page(html))],
+        list_nema.clean_data,
+    ),
+    'willow_bridge': (
+        'willow_bridge.html', '//*[@id="availability-table"]/tbody/tr',
+        lambda html: [list_1000m.parse_table(html)],
+        list_1000m.clean_data,
+    ),
+    'rentcafe_units_list': (
+        'rentcafe_units_list.html', class_xpath('unit-item', scope='//'),
+        lambda html: [list_1130.parse_listings(html)],
+        clean_with(with_rent, list_1130.clean_data),
+    ),
+    'floorplan_section': (
+        'floorplan_section.html', class_xpath('floorplan-section', scope='//') + '//tbody/tr',
+        lambda html: list(list_1140.parse_floor_plans(html)),
+        clean_with(with_lease_details, list_1140.clean_data),
+    ),
+    'floorplan_page': (
+        'floorplan_page.html', class_xpath('table-responsive', scope='//') + '//tbody/tr',
+        lambda html: [list_elle.parse_floor_plan(html, 'https://www.theellechicago.com/floorplans/a1')],
+        clean_with(with_lease_details, list_elle.clean_data),
+    ),
+    'reed': (
+        'reed.html', class_xpath('availability-mdl__table', scope='//', tag='div') + '//tbody/tr',
+        lambda html: list(list_reed.parse_floor_plans(html)),
+        clean_with(with_lease_details, list_reed.clean_data),
+    ),
+    'lease': (
+        'lease.html', None,
+        parse_lease_pages,
+        None,
+    ),
+    'apartments_com': (
+        'apartments_com.html', class_xpath('unitContainer', scope='//', tag='li'),
+        lambda html: [aggregator.parse_building(html).assign(Building='Cooper')],
+        aggregator.clean_data,
+    ),
+}
+
+
+def scaled_input(name, size):
+    """The page of a template scaled to size units; a lease page lists one unit, so it is parsed size times."""
+    fixture_name, rows_xpath, _, _ = CASES[name]
+    html = fixture(fixture_name)
+    return [html] * size if rows_xpath is None else scale_rows(html, rows_xpath, size)
+
+
+def run_case(parse, clean, page):
+    """Parse and clean one scaled page, return (parse seconds, clean seconds, rows)."""
+    start = time.perf_counter()
+    frames = parse(page)
+    parsed = time.perf_counter()
+    if clean is not None:
+        frames = [clean(frame, RETRIEVED) for frame in frames]
+    cleaned = time.perf_counter()
+    return parsed - start, cleaned - parsed, sum(len(frame) for frame in frames)
+
+
+def peak_memory(parse, clean, page):
+    tracemalloc.start()
+    try:
+        run_case(parse, clean, page)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench(name, size, repeat):
+    _, _, parse, clean = CASES[name]
+    page = scaled_input(name, size)
+    # the spiders print their progress, which is part of their cost but not of the output
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        timings = [run_case(parse, clean, page) for _ in range(repeat)]
+        peak = peak_memory(parse, clean, page)
+    parse_seconds = min(timing[0] for timing in timings)
+    clean_seconds = min(timing[1] for timing in timings)
+    rows = timings[0][2]
+    return {
+        'rows': rows,
+        'page_kib': sum(map(len, page)) / 1024 if isinstance(page, list) else len(page) / 1024,
+        'parse_seconds': parse_seconds,
+        'clean_seconds': clean_seconds,
+        'rows_per_second': rows / (parse_seconds + clean_seconds),
+        'peak_mib': peak / 2 ** 20,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return the cases whose rows/sec dropped below baseline / tolerance, with their slowdown."""
+    slower = {}
+    for case, result in results.items():
+        if case in baseline:
+            slowdown = baseline[case]['rows_per_second'] / result['rows_per_second']
+            if slowdown > tolerance:
+                slower[case] = slowdown
+    return slower
+
+
+def option(name, default):
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else default
+
+
+def main():
+    sizes = [int(size) for size in option('--sizes', '100,1000,10000').split(',')]
+    repeat = int(option('--repeat', '3'))
+    sites = option('--sites', ','.join(CASES)).split(',')
+    baseline_path = option('--baseline', None)
+    tolerance = float(option('--tolerance', '1.25'))
+
+    # per-unit info logs would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {}
+    for name in sites:
+        for size in sizes:
+            results[f'{name}/{size}'] = bench(name, size, repeat)
+
+    slower = {}
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as f:
+            slower = compare(results, json.load(f), tolerance)
+
+    if '--json' in sys.argv:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'case':<28}{'rows':>8}{'page KiB':>10}{'parse (s)':>11}{'clean (s)':>11}{'rows/s':>11}"
+              f"{'peak MiB':>10}")
+        for case, result in results.items():
+            print(f"{case:<28}{result['rows']:>8}{result['page_kib']:>10.0f}{result['parse_seconds']:>11.4f}"
+                  f"{result['clean_seconds']:>11.4f}{result['rows_per_second']:>11.0f}{result['peak_mib']:>10.1f}")
+
+    if slower:
+        for case, slowdown in slower.items():
+            print(f"{case}: {slowdown:.2f}x slower than the baseline", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Startup benchmark: time from interpreter start to the first request of each spider.
+
+Every spider runs in a fresh python process so imports are measured cold. The first request is
+a browser page load for selenium spiders and a plain GET for requests-only spiders.
+
+usage (from the project root):
+    python -m benchmarks.bench_startup
+    FAST_STARTUP=0 python -m benchmarks.bench_startup    # compare with the old behaviour
+"""
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# spider module -> (settings url name, uses browser)
+SPIDERS = {
+    'spider.list_1000m': ('M1000_URL', True),
+    'spider.list_1130': ('ELEVEN30_URL', True),
+    'spider.list_1140': ('ELEVEN40_URL', True),
+    'spider.list_elle': ('ELLE_URL', True),
+    'spider.list_grandcentral': ('GRAND_CENTRAL_URL', True),
+    'spider.list_linea': ('LINEA_URL', True),
+    'spider.list_nema': ('NEMA_URL', False),
+    'spider.list_reed': ('REED_URL', True),
+}
+
+PROBE = '''
+import time
+t0 = time.perf_counter()
+import importlib, json, settings
+importlib.import_module({module!r})
+t_import = time.perf_counter()
+url = getattr(settings, {url_name!r})
+if {browser!r}:
+    from driver_pool import driver_pool
+    with driver_pool.lease() as driver:
+        t_ready = time.perf_counter()
+        driver.get(url)
+    driver_pool.close()
+else:
+    import requests
+    session = requests.Session()
+    t_ready = time.perf_counter()
+    session.get(url, timeout=30)
+t_first = time.perf_counter()
+print(json.dumps({{"import": t_import - t0, "ready": t_ready - t0, "first_request": t_first - t0}}))
+'''
+
+
+def bench_spider(module, url_name, browser):
+    code = PROBE.format(module=module, url_name=url_name, browser=browser)
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr else 'failed'}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    mode = 'fast' if os.getenv('FAST_STARTUP', '1') == '1' else 'legacy'
+    results = {}
+    print(f"startup mode: {mode}")
+    print(f"{'spider':<28}{'import (s)':>12}{'ready (s)':>12}{'first req (s)':>15}")
+    for module, (url_name, browser) in SPIDERS.items():
+        timing = bench_spider(module, url_name, browser)
+        results[module] = timing
+        if 'error' in timing:
+            print(f"{module:<28}  error: {timing['error']}")
+        else:
+            print(f"{module:<28}{timing['import']:>12.3f}{timing['ready']:>12.3f}{timing['first_request']:>15.3f}")
+
+    if '--json' in sys.argv:
+        print(json.dumps({'mode': mode, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
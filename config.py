@@ -1,33 +1,96 @@
-import psycopg2
-from psycopg2 import OperationalError
+import atexit
+import threading
+from contextlib import contextmanager
 
-from settings import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+from settings import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_POOL_MIN, DB_POOL_MAX
+from log import logger
 
-def create_connection(db_name, db_user, db_password, db_host, db_port):
+# NOTE: database connections
+# psycopg2 is imported and the pool is created on the first db.connection(), so importing a spider
+# doesn't need the database to be reachable; every with-block borrows a connection from the pool and
+# commits or rolls back before returning it
+
+
+class ConnectionManager(object):
     """
-    Create a database connection to a PostgreSQL database
-    :param db_name: name of the database
-    :param db_user: user of the database
-    :param db_password: password for the database user
-    :param db_host: host where the database server is located
-    :param db_port: port number that the database server is listening on
-    :return: connection object or None
+    Lazily created, thread-safe pool of PostgreSQL connections.
+    Borrowing blocks while all max_size connections are in use, a broken connection is replaced.
     """
-    conn = None
-    try:
-        conn = psycopg2.connect(
-            dbname=db_name,
-            user=db_user,
-            password=db_password,
-            host=db_host,
-            port=db_port
-        )
-        print("Connection to PostgreSQL DB successful")
-    except OperationalError as e:
-        print(f"The error '{e}' occurred")
-    return conn
-
-# Example usage
-connection = create_connection(
-    DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
-)
+
+    def __init__(self, min_size=DB_POOL_MIN, max_size=DB_POOL_MAX, **params):
+        """
+        :param params: psycopg2.connect arguments, the DB_* settings by default
+        """
+        self.min_size = min_size
+        self.max_size = max_size
+        self.params = params or {
+            'dbname': DB_NAME,
+            'user': DB_USER,
+            'password': DB_PASSWORD,
+            'host': DB_HOST,
+            'port': DB_PORT,
+        }
+        self._pool = None
+        self._lock = threading.Lock()
+        # ThreadedConnectionPool raises instead of waiting when it is exhausted
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None or self._pool.closed:
+                from psycopg2.pool import ThreadedConnectionPool
+                self._pool = ThreadedConnectionPool(self.min_size, self.max_size, **self.params)
+                logger.info(f"Connected to PostgreSQL {self.params.get('dbname')} at {self.params.get('host')}")
+            return self._pool
+
+    def _checkout(self, pool):
+        import psycopg2
+
+        conn = pool.getconn()
+        try:
+            if conn.closed:
+                raise psycopg2.InterfaceError('connection already closed')
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            # the server dropped it (restart, idle timeout), reconnect once
+            logger.warning(f"Replacing broken database connection: {e}")
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the with-block, committed on success and rolled back on error."""
+        import psycopg2
+
+        self._slots.acquire()
+        conn = None
+        broken = False
+        try:
+            pool = self._get_pool()
+            conn = self._checkout(pool)
+            yield conn
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except Exception:
+            if conn is not None and not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            if conn is not None:
+                pool.putconn(conn, close=broken or bool(conn.closed))
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None and not self._pool.closed:
+                self._pool.closeall()
+            self._pool = None
+
+
+db = ConnectionManager()
+atexit.register(db.close)
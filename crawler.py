@@ -0,0 +1,95 @@
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from settings import DETAIL_WORKERS, DETAIL_PER_HOST, WORKER_BUDGET, HOST_INTERVAL
+from metrics import metrics
+from log import logger
+
+# outcome of one detail page, error is None when fetch returned normally
+DetailResult = namedtuple('DetailResult', ['link', 'value', 'error'])
+
+
+class HostLimiter(object):
+    """Cap the number of requests in flight to the same host, shared by every crawl in the process."""
+
+    def __init__(self, per_host=DETAIL_PER_HOST):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+
+class HostPacer(object):
+    """Space out request starts to the same host by at least its HOST_INTERVAL, instead of a fixed sleep."""
+
+    def __init__(self, intervals=HOST_INTERVAL):
+        self.intervals = intervals
+        self._lock = threading.Lock()
+        self._next = {}
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        interval = self.intervals.get(host)
+        if not interval:
+            return
+        # reserve the next start time under the lock, sleep outside of it
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start + interval
+        if start > now:
+            with metrics.timer('host_wait'):
+                time.sleep(start - now)
+
+
+host_limiter = HostLimiter()
+host_pacer = HostPacer()
+# global budget so concurrent spiders together never exceed WORKER_BUDGET detail requests
+worker_budget = threading.BoundedSemaphore(WORKER_BUDGET)
+
+
+def _fetch_one(link, fetch):
+    if not link:
+        return DetailResult(link, None, 'missing link')
+    try:
+        with host_limiter.slot(link):
+            # paced before taking a budget slot, so waiting on a slow host doesn't hold back other sites
+            host_pacer.wait(link)
+            with worker_budget:
+                return DetailResult(link, fetch(link), None)
+    except Exception as e:
+        logger.error(f"Error fetching detail page {link}: {e}")
+        return DetailResult(link, None, str(e))
+
+
+def crawl_details(links, fetch, max_workers=DETAIL_WORKERS):
+    """
+    Call fetch(link) for every link with bounded concurrency.
+    :param links: detail page urls, None entries are reported as errors without fetching
+    :param fetch: function that takes a link and returns the parsed details
+    :param max_workers: number of pages fetched in parallel
+    :return: list of DetailResult in the same order as links
+    """
+    links = list(links)
+    if not links:
+        return []
+
+    # the workers count their pages under the site of the calling spider
+    fetch_one = metrics.bind(lambda link: _fetch_one(link, fetch))
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(links))) as executor:
+        results = list(executor.map(fetch_one, links))
+
+    failed = sum(1 for r in results if r.error)
+    if failed:
+        metrics.count('detail_failures', failed)
+    logger.info(f"Fetched {len(results) - failed} of {len(results)} detail pages, {failed} failed")
+    return results
@@ -0,0 +1,223 @@
+import os
+import atexit
+import queue
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+
+from settings import (DRIVER_POOL_SIZE, DRIVER_MAX_PAGES, PAGE_LOAD_STRATEGY, CHROME_PROFILE_DIR,
+                      BLOCKED_RESOURCES, PAGE_PROFILES)
+from utils import setup_driver
+from metrics import metrics
+from log import logger
+
+# errors raised by the page itself, the browser session is still healthy after these
+PAGE_ERRORS = (NoSuchElementException, TimeoutException)
+
+
+def count_commands(driver, count):
+    """
+    Call count(command) before every WebDriver command the driver sends to chromedriver.
+    Every find_element, .text, get_attribute and execute_script is one http round trip, WebElement methods go
+    through their driver's execute as well.
+    """
+    execute = driver.execute
+
+    def counted(driver_command, params=None):
+        count(driver_command)
+        return execute(driver_command, params)
+
+    driver.execute = counted
+    return driver
+
+
+class DriverPool(object):
+    """
+    Keep a bounded set of Chrome sessions alive and lend them out with lease/return semantics.
+    A session is recycled after max_pages leases or when a lease ends with a browser error.
+    With lean=True every lease blocks the resource types listed in the site's page-load profile.
+    """
+
+    def __init__(self, max_size=DRIVER_POOL_SIZE, max_pages=DRIVER_MAX_PAGES, headless=True,
+                 page_load_strategy=PAGE_LOAD_STRATEGY, profile_dir=CHROME_PROFILE_DIR, lean=True):
+        self.max_size = max_size
+        self.max_pages = max_pages
+        self.headless = headless
+        self.page_load_strategy = page_load_strategy
+        self.profile_dir = profile_dir
+        self.lean = lean
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._pages = {}
+        self._blocked = {}
+        # chrome locks its user data dir, so every live session gets its own sub directory
+        self._free_profiles = list(range(max_size))
+        self._profiles = {}
+        self._closed = False
+        self._stats = {'created': 0, 'leases': 0, 'recycled': 0, 'errors': 0, 'in_use': 0}
+        # site each session is leased to, and webdriver commands sent per site
+        self._sites = {}
+        self._commands = Counter()
+
+    @contextmanager
+    def lease(self, site=None):
+        """
+        Borrow a driver for the duration of the with-block, blocking while all sessions are busy.
+        :param site: key into PAGE_PROFILES, decides which resource types are blocked
+        """
+        self._slots.acquire()
+        driver = None
+        healthy = True
+        try:
+            driver = self._checkout()
+            with self._lock:
+                self._sites[id(driver)] = site
+            if self.lean:
+                self._apply_profile(driver, site)
+            yield driver
+        except PAGE_ERRORS:
+            raise
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            if driver is not None:
+                self._checkin(driver, healthy)
+            self._slots.release()
+
+    def _checkout(self):
+        try:
+            driver = self._idle.get_nowait()
+        except queue.Empty:
+            driver = self._start()
+            with self._lock:
+                self._stats['created'] += 1
+            logger.debug(f"Started new browser session, {self._stats['created']} created so far")
+
+        with self._lock:
+            self._stats['leases'] += 1
+            self._stats['in_use'] += 1
+        return driver
+
+    def _start(self):
+        user_data_dir = None
+        with self._lock:
+            profile = self._free_profiles.pop() if self.profile_dir else None
+        if profile is not None:
+            user_data_dir = os.path.join(self.profile_dir, f'session-{profile}')
+        try:
+            with metrics.timer('driver_start'):
+                driver = setup_driver(headless=self.headless, page_load_strategy=self.page_load_strategy,
+                                      user_data_dir=user_data_dir)
+        except Exception:
+            if profile is not None:
+                with self._lock:
+                    self._free_profiles.append(profile)
+            raise
+        with self._lock:
+            self._pages[id(driver)] = 0
+            self._profiles[id(driver)] = profile
+        return count_commands(driver, lambda command: self._count_command(driver))
+
+    def _count_command(self, driver):
+        with self._lock:
+            # commands outside a lease (resetting, quitting) are the pool's own
+            self._commands[self._sites.get(id(driver)) or 'pool'] += 1
+
+    def _apply_profile(self, driver, site):
+        """Block the url patterns of the content types the site doesn't need, e.g. images and fonts."""
+        content_types = PAGE_PROFILES.get(site, PAGE_PROFILES['default'])
+        patterns = [pattern for content_type in content_types for pattern in BLOCKED_RESOURCES[content_type]]
+        if self._blocked.get(id(driver)) == patterns:
+            return
+        if id(driver) not in self._blocked:
+            driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+        self._blocked[id(driver)] = patterns
+
+    def _checkin(self, driver, healthy):
+        with self._lock:
+            self._sites.pop(id(driver), None)
+            self._stats['in_use'] -= 1
+            self._pages[id(driver)] += 1
+            pages = self._pages[id(driver)]
+            if not healthy:
+                self._stats['errors'] += 1
+
+        if healthy and not self._closed and pages < self.max_pages and self._reset(driver):
+            self._idle.put(driver)
+            return
+
+        logger.debug(f"Recycling browser session after {pages} pages (healthy={healthy})")
+        with self._lock:
+            self._stats['recycled'] += 1
+        self._quit(driver)
+
+    def _reset(self, driver):
+        """Clear cookies and web storage so the next lease starts from a clean session."""
+        try:
+            driver.delete_all_cookies()
+            driver.execute_script('try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}')
+            driver.get('about:blank')
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to reset browser session: {e}")
+            return False
+
+    def _quit(self, driver):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+            self._blocked.pop(id(driver), None)
+            profile = self._profiles.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"Error while closing browser session: {e}")
+        if profile is not None:
+            with self._lock:
+                self._free_profiles.append(profile)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['idle'] = self._idle.qsize()
+        return stats
+
+    def command_stats(self):
+        """WebDriver commands sent per site."""
+        with self._lock:
+            return dict(self._commands)
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"Driver pool: {stats['created']} sessions created, {stats['leases']} leases, "
+            f"{stats['recycled']} recycled, {stats['errors']} errors, {stats['idle']} idle"
+        )
+        commands = self.command_stats()
+        if commands:
+            logger.info('WebDriver commands: ' + ', '.join(f'{site} {n}' for site, n in sorted(commands.items())))
+
+    def close(self):
+        """Quit every idle session, sessions currently leased are closed when they are returned."""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
+
+
+driver_pool = DriverPool()
+atexit.register(driver_pool.close)
+
+
+if __name__ == '__main__':
+    with driver_pool.lease() as driver:
+        driver.get('https://www.example.com')
+        print(driver.title)
+    driver_pool.log_stats()
@@ -0,0 +1,271 @@
+import io
+import re
+from functools import lru_cache
+from urllib.parse import urljoin, urlsplit
+
+import pandas as pd
+from lxml import etree
+from lxml import html as lxml_html
+
+from settings import PARTIAL_PARSE
+
+# NOTE: lxml extraction engine
+# every page is parsed once with lxml, spiders keep their selectors as module-level compiled xpaths
+# (lxml compiles the expression again on every element.xpath(...) call) and read tables with read_table,
+# which gives the same frame as pd.read_html(...)[0] and the links of every row from the same parse
+# with PARTIAL_PARSE the parser stops at the end of the container the spider needs, see parse_section
+
+# elements that start a new line in the rendered text, like selenium's WebElement.text
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'fieldset', 'figcaption',
+    'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav',
+    'ol', 'p', 'pre', 'section', 'table', 'tbody', 'tfoot', 'thead', 'tr', 'ul',
+}
+SKIP_TAGS = {'script', 'style', 'noscript', 'template'}
+
+# like pd.read_html: whitespace runs with a newline or of 2+ characters become one space
+WHITESPACE = re.compile(r'[\r\n]+|\s{2,}')
+# cells read_html turns into NaN
+NA_VALUES = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+             'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+
+def class_xpath(name, scope='.//', tag='*'):
+    """xpath matching elements that have the css class name, like By.CLASS_NAME."""
+    return f"{scope}{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]"
+
+
+@lru_cache(maxsize=None)
+def xpath(expression):
+    """Compiled xpath, call it with the element to search: xpath('.//a')(element)."""
+    return etree.XPath(expression)
+
+
+TABLES = xpath('descendant-or-self::table')
+THEAD_ROWS = xpath('.//thead/tr')
+TBODY_ROWS = xpath('.//tbody//tr')
+ROOT_ROWS = xpath('./tr')
+TFOOT_ROWS = xpath('.//tfoot//tr')
+CELLS = xpath('./td|./th')
+HREFS = xpath('.//a/@href')
+LINK_ELEMENTS = xpath('descendant-or-self::a[@href]')
+HIDDEN = xpath(".//*[contains(translate(@style, ' ', ''), 'display:none')]")
+TEXT = xpath('string()')
+
+
+def parse_html(page, base_url=None):
+    """Parse a page with lxml, link hrefs are made absolute the way the browser reports them."""
+    tree = lxml_html.fromstring(page)
+    if base_url:
+        absolute_links(tree, base_url)
+    return tree
+
+
+def absolute_links(element, base_url):
+    # only <a href>, make_links_absolute also rewrites every src, srcset and url() in inline css,
+    # which takes several times as long as parsing the page
+    join = link_joiner(base_url)
+    for link in LINK_ELEMENTS(element):
+        link.set('href', join(link.get('href')))
+    return element
+
+
+def link_joiner(base_url):
+    """urljoin(base_url, href), with the common absolute and root-relative hrefs joined without parsing."""
+    base = urlsplit(base_url)
+    origin = f'{base.scheme}://{base.netloc}'
+
+    def join(href):
+        href = href.strip()
+        if href.startswith(('https://', 'http://')):
+            return href
+        if href.startswith('/') and not href.startswith('//') and '/.' not in href:
+            return origin + href
+        return urljoin(base_url, href)
+
+    return join
+
+
+def _walk(node, parts):
+    if not isinstance(node.tag, str) or node.tag in SKIP_TAGS:
+        return
+    block = node.tag in BLOCK_TAGS
+    if block:
+        parts.append('\n')
+    if node.text:
+        parts.append(node.text)
+    for child in node:
+        _walk(child, parts)
+        if child.tail:
+            parts.append(child.tail)
+    if block:
+        parts.append('\n')
+
+
+def inner_text(element):
+    """Approximate the rendered text of an element: one line per block, whitespace collapsed."""
+    parts = []
+    _walk(element, parts)
+    lines = (' '.join(line.split()) for line in ''.join(parts).split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def outer_html(element):
+    return lxml_html.tostring(element, encoding='unicode')
+
+
+def joined_text(element):
+    """Text of every text node stripped and joined, like BeautifulSoup's get_text(strip=True)."""
+    return ''.join(text.strip() for text in element.itertext())
+
+
+def _hidden(element):
+    style = element.get('style')
+    return style is not None and 'display:none' in style.replace(' ', '')
+
+
+def _cell_text(element, parts):
+    # text_content() without the elements pd.read_html drops as hidden
+    if element.text:
+        parts.append(element.text)
+    for child in element:
+        if isinstance(child.tag, str) and not _hidden(child):
+            _cell_text(child, parts)
+        if child.tail:
+            parts.append(child.tail)
+    return parts
+
+
+def _expand(rows, has_hidden=True):
+    """[(tr, cells)] -> text rows with colspan and rowspan cells repeated, as pd.read_html does."""
+    texts_rows = []
+    remainder = []      # (index, text, rows left) of cells spanning into the next rows
+    for cells in rows:
+        texts = []
+        next_remainder = []
+        index = 0
+        for cell in cells:
+            while remainder and remainder[0][0] <= index:
+                prev_index, prev_text, prev_rows = remainder.pop(0)
+                texts.append(prev_text)
+                if prev_rows > 1:
+                    next_remainder.append((prev_index, prev_text, prev_rows - 1))
+                index += 1
+            text = ''.join(_cell_text(cell, [])) if has_hidden else TEXT(cell)
+            text = WHITESPACE.sub(' ', text.strip())
+            rowspan = int(cell.get('rowspan') or 1)
+            for _ in range(int(cell.get('colspan') or 1)):
+                texts.append(text)
+                if rowspan > 1:
+                    next_remainder.append((index, text, rowspan - 1))
+                index += 1
+        for prev_index, prev_text, prev_rows in remainder:
+            texts.append(prev_text)
+            if prev_rows > 1:
+                next_remainder.append((prev_index, prev_text, prev_rows - 1))
+        texts_rows.append(texts)
+        remainder = next_remainder
+    while remainder:
+        texts_rows.append([text for _, text, _ in remainder])
+        remainder = [(index, text, rows - 1) for index, text, rows in remainder if rows > 1]
+    return texts_rows
+
+
+def _column_names(header, width):
+    names, seen = [], {}
+    for position in range(width):
+        name = header[position] if position < len(header) and header[position] else f'Unnamed: {position}'
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def read_table(element, link_cell=None, base_url=None):
+    """
+    Read the first table in element (or element itself) the way pd.read_html(...)[0] does:
+    thead or leading all-<th> rows give the header, empty header cells become 'Unnamed: i', colspan and
+    rowspan cells are repeated, hidden (display:none) rows and cells are dropped, whitespace is collapsed
+    and empty or NA-like cells are NaN. Cells are kept as text.
+    :param link_cell: position of the cell the row links are taken from, e.g. -1, every cell if None
+    :param base_url: relative links are resolved against it
+    :return: (DataFrame, list with the hrefs of every body row)
+    """
+    tables = TABLES(element) if element is not None else []
+    if not tables:
+        raise ValueError('No tables found')
+    table = tables[0]
+
+    def visible(rows):
+        return [(row, [cell for cell in CELLS(row) if not _hidden(cell)]) for row in rows if not _hidden(row)]
+
+    head = visible(THEAD_ROWS(table))
+    body = visible(TBODY_ROWS(table) + ROOT_ROWS(table))
+    foot = visible(TFOOT_ROWS(table))
+    if not head:
+        while body and body[0][1] and all(cell.tag == 'th' for cell in body[0][1]):
+            head.append(body.pop(0))
+    body += foot
+
+    join = link_joiner(base_url) if base_url else None
+
+    def links(cells):
+        if not cells:
+            return []
+        hrefs = HREFS(cells[link_cell]) if link_cell is not None else [h for cell in cells for h in HREFS(cell)]
+        return [join(href) for href in hrefs] if join else hrefs
+
+    # without hidden elements the text of a cell is its string value, read in one libxml2 call
+    has_hidden = bool(HIDDEN(table))
+    header_rows = [row for row in _expand([cells for _, cells in head], has_hidden) if any(row)]
+    body_rows = _expand([cells for _, cells in body], has_hidden)
+    row_links = [links(cells) for _, cells in body] + [[]] * (len(body_rows) - len(body))
+
+    width = max([len(row) for row in header_rows[:1] + body_rows] or [0])
+    records = [[None if text in NA_VALUES else text for text in row] + [None] * (width - len(row)) for row in body_rows]
+    columns = _column_names(header_rows[0], width) if header_rows else list(range(width))
+    df = pd.DataFrame(records, columns=columns, dtype=object).fillna(float('nan'))
+    return df, row_links
+
+
+def _matches(element, class_name, element_id):
+    if element_id is not None and element.get('id') != element_id:
+        return False
+    if class_name is not None and class_name not in (element.get('class') or '').split():
+        return False
+    return True
+
+
+def _section_xpath(tag, class_name, element_id):
+    expression = f"//{tag or '*'}"
+    if element_id is not None:
+        expression += f'[@id="{element_id}"]'
+    if class_name is not None:
+        expression += f"[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+    return xpath(expression)
+
+
+def parse_section(page, tag=None, class_name=None, element_id=None, base_url=None):
+    """
+    Return the first element with the tag (any tag if None), css class and id.
+    With PARTIAL_PARSE the page is only parsed up to the end of that element, the rest is never read;
+    otherwise, or if the element isn't found that way, the whole page is parsed.
+    :return: the element, None if the page doesn't have it
+    """
+    if PARTIAL_PARSE:
+        events = etree.iterparse(io.BytesIO(page.encode('utf-8')), events=('end',), tag=tag, html=True,
+                                 encoding='utf-8', remove_comments=True)
+        try:
+            for _, element in events:
+                if _matches(element, class_name, element_id):
+                    return absolute_links(element, base_url) if base_url else element
+        except etree.LxmlError:
+            pass
+
+    elements = _section_xpath(tag, class_name, element_id)(parse_html(page))
+    if not elements:
+        return None
+    return absolute_links(elements[0], base_url) if base_url else elements[0]
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from settings import (HTTP_POOL_SIZE, CACHE_DIR, FETCH_TIER_CACHE, FETCH_TIER_REPROBE, PAGE_WAIT,
+                      PAGE_POLL)
+from utils import get_user_agent
+from http_cache import http_cache
+from archive import archive
+from metrics import metrics
+from log import logger
+
+# NOTE: fetch tiers
+# every listing page is first tried with a plain GET and parsed by the spider, if the parse finds its target
+# element in the server-rendered html the site stays on the http tier, otherwise it is escalated to the browser;
+# the page is only parsed once, the spider's parse is the check
+# the decision is cached per site and browser sites are re-probed every FETCH_TIER_REPROBE seconds
+
+_session = None
+_session_lock = threading.Lock()
+_tiers = None
+_tiers_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide requests session, keep-alive connections are reused across spiders."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = get_user_agent()
+            _session = session
+    return _session
+
+
+def http_get(url, site=None):
+    """
+    GET a page with the shared session through the http cache and return its html.
+    Raises requests exceptions on failure.
+    """
+    return http_cache.get(get_session(), url, site).text
+
+
+def _load_tiers():
+    global _tiers
+    if _tiers is None:
+        try:
+            with open(FETCH_TIER_CACHE, encoding='utf-8') as f:
+                _tiers = json.load(f)
+        except (OSError, ValueError):
+            _tiers = {}
+    return _tiers
+
+
+def get_tier(site):
+    """Return 'http' or 'browser' for a site, or None if it has to be probed."""
+    with _tiers_lock:
+        entry = _load_tiers().get(site)
+    if entry is None:
+        return None
+    if entry['tier'] == 'browser' and time.time() - entry['checked'] > FETCH_TIER_REPROBE:
+        return None
+    return entry['tier']
+
+
+def set_tier(site, tier):
+    with _tiers_lock:
+        tiers = _load_tiers()
+        previous = tiers.get(site, {}).get('tier')
+        if previous == tier == 'http':
+            return
+        tiers[site] = {'tier': tier, 'checked': time.time()}
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(FETCH_TIER_CACHE, 'w', encoding='utf-8') as f:
+            json.dump(tiers, f, indent=2)
+    if previous != tier:
+        logger.info(f"Fetch tier for {site}: {previous} -> {tier}")
+
+
+def browser_get(url, xpath, site=None, timeout=PAGE_WAIT, pool=None):
+    """
+    Load url in a pooled browser and return the rendered html as soon as xpath is present.
+    :param site: page-load profile to use, see PAGE_PROFILES
+    :param pool: driver pool to lease from, the shared one by default
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from driver_pool import driver_pool
+
+    with (pool or driver_pool).lease(site) as driver:
+        start = time.perf_counter()
+        with metrics.timer('page_load', site):
+            driver.get(url)
+        with metrics.timer('wait', site):
+            WebDriverWait(driver, timeout, poll_frequency=PAGE_POLL).until(
+                EC.presence_of_element_located((By.XPATH, xpath))
+            )
+        logger.info(f"{site}: page ready in {time.perf_counter() - start:.2f}s")
+        page = driver.page_source
+
+    metrics.count('pages_fetched', site=site)
+    metrics.count('browser_pages', site=site)
+    metrics.count('bytes_downloaded', len(page.encode('utf-8')), site=site)
+    return page
+
+
+def _found(parsed):
+    """Whether a parse found what it looked for: None, an empty frame or an empty list mean it did not."""
+    if parsed is None:
+        return False
+    empty = getattr(parsed, 'empty', None)
+    if empty is not None:
+        return not empty
+    return not hasattr(parsed, '__len__') or len(parsed) > 0
+
+
+def fetch_page(site, url, xpath, parse):
+    """
+    Fetch a page and return parse(html), over plain http when the site serves the target element server-side.
+    An unchanged http page reuses the result parsed last time, see http_cache.parse.
+    :param site: key the tier decision is cached under
+    :param url: page to fetch
+    :param xpath: element the spider needs, the browser waits for it
+    :param parse: html -> result, e.g. the spider's parse function; a result without anything in it (None, an
+        empty frame or list) means the http response is incomplete and the page is loaded in the browser
+    """
+    if archive.replaying:
+        return parse(archive.lookup(site, url))
+
+    if get_tier(site) != 'browser':
+        try:
+            page = http_cache.get(get_session(), url, site)
+            parsed = http_cache.parse(page, parse)
+            if _found(parsed):
+                set_tier(site, 'http')
+                archive.record(site, url, page.text)
+                return parsed
+            logger.info(f"{site}: target element not in server-rendered html, escalating to browser")
+        except requests.RequestException as e:
+            logger.warning(f"{site}: plain http fetch failed ({e}), escalating to browser")
+        set_tier(site, 'browser')
+        metrics.count('retries', site=site)
+
+    page = browser_get(url, xpath, site)
+    archive.record(site, url, page)
+    return parse(page)
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+from collections import namedtuple, Counter
+
+from settings import HTTP_CACHE_DIR, HTTP_CACHE_TTL, HTTP_TIMEOUT
+from metrics import metrics
+from log import logger
+
+# NOTE: on-disk http cache keyed by url
+# within the site's ttl a page is served from disk without a request, after that it is revalidated with
+# If-None-Match / If-Modified-Since, a 304 (or an identical body) marks the page as not modified
+# so callers can reuse the result they parsed last time instead of parsing again
+
+CachedPage = namedtuple('CachedPage', ['url', 'text', 'digest', 'not_modified'])
+
+
+class HttpCache(object):
+
+    def __init__(self, root=HTTP_CACHE_DIR):
+        self.root = root
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def _path(self, url, suffix):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, key[:2], f'{key}{suffix}')
+
+    def _read_meta(self, url):
+        try:
+            with open(self._path(url, '.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_body(self, url):
+        with open(self._path(url, '.html'), encoding='utf-8') as f:
+            return f.read()
+
+    def _write(self, path, data, mode='w'):
+        # write to a temp file first so a concurrent reader never sees half a page
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def get(self, session, url, site=None):
+        """
+        Return the page at url as a CachedPage, requesting it only when the cached copy is stale.
+        :param session: requests session used for the request
+        :param site: key into HTTP_CACHE_TTL
+        """
+        ttl = HTTP_CACHE_TTL.get(site, HTTP_CACHE_TTL['default'])
+        meta = self._read_meta(url)
+        if meta is not None and not os.path.exists(self._path(url, '.html')):
+            meta = None
+
+        if meta is not None and time.time() - meta['fetched'] < ttl:
+            self._count('fresh')
+            return CachedPage(url, self._read_body(url), meta['digest'], True)
+
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        with metrics.timer('http', site):
+            response = session.get(url, headers=headers, timeout=HTTP_TIMEOUT)
+        metrics.count('pages_fetched', site=site)
+        metrics.count('bytes_downloaded', len(response.content), site=site)
+        if response.status_code == 304 and meta is not None:
+            self._count('not_modified')
+            meta['fetched'] = time.time()
+            self._write(self._path(url, '.json'), json.dumps(meta))
+            return CachedPage(url, self._read_body(url), meta['digest'], True)
+
+        response.raise_for_status()
+        text = response.text
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        not_modified = meta is not None and meta['digest'] == digest
+        self._count('unchanged' if not_modified else 'downloaded')
+
+        self._write(self._path(url, '.html'), text)
+        self._write(self._path(url, '.json'), json.dumps({
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched': time.time(),
+            'digest': digest,
+        }))
+        return CachedPage(url, text, digest, not_modified)
+
+    def parse(self, page, parse):
+        """Return parse(page.text), reusing the stored result when the page has not changed."""
+        path = self._path(page.url, '.parsed')
+        if page.not_modified:
+            try:
+                with open(path, 'rb') as f:
+                    digest, parsed = pickle.load(f)
+                if digest == page.digest:
+                    self._count('parse_skipped')
+                    return parsed
+            except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+                pass
+
+        parsed = parse(page.text)
+        if page.digest is not None:
+            self._write(path, pickle.dumps((page.digest, parsed)), mode='wb')
+        return parsed
+
+    def log_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        logger.info(
+            f"HTTP cache: {stats.get('fresh', 0)} fresh, {stats.get('not_modified', 0)} not modified (304), "
+            f"{stats.get('unchanged', 0)} unchanged, {stats.get('downloaded', 0)} downloaded, "
+            f"{stats.get('parse_skipped', 0)} parses skipped"
+        )
+
+
+http_cache = HttpCache()
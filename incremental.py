@@ -0,0 +1,96 @@
+import hashlib
+
+from settings import INCREMENTAL, INCREMENTAL_MAX_AGE_DAYS, STORAGE_MODEL
+from config import db
+from crawler import crawl_details
+from archive import archive
+from log import logger
+
+# NOTE: incremental detail crawling
+# each listing row (everything the listing page shows about a unit, without the detail href) is fingerprinted
+# and the fingerprint is stored with the row (in availabilities or listing_intervals); if the same fingerprint was stored recently,
+# the unit hasn't changed and its 12-month rent and available date are reused instead of visiting the detail page
+
+previous_query = """
+SELECT DISTINCT ON (fingerprint) fingerprint, rent, available_date
+FROM availabilities
+WHERE apartment = %s AND fingerprint = ANY(%s) AND retrieved >= now() - %s * interval '1 day'
+ORDER BY fingerprint, retrieved DESC;
+"""
+
+previous_interval_query = """
+SELECT DISTINCT ON (fingerprint) fingerprint, rent, available_date
+FROM listing_intervals
+WHERE apartment = %s AND fingerprint = ANY(%s) AND last_seen >= now() - %s * interval '1 day'
+ORDER BY fingerprint, last_seen DESC;
+"""
+
+
+def fingerprint_rows(df):
+    """Hash the listing-level cells of every row, the detail link is left out since it may carry session ids."""
+    columns = [column for column in df.columns if column != 'href']
+    joined = df[columns].astype(str).agg('\x1f'.join, axis=1)
+    return joined.map(lambda row: hashlib.sha1(row.encode('utf-8')).hexdigest())
+
+
+def load_previous(apartment, fingerprints):
+    """Return {fingerprint: {'rent': ..., 'available_date': ...}} of the latest stored rows."""
+    with db.connection() as conn, conn.cursor() as cursor:
+        query = previous_interval_query if STORAGE_MODEL == 'intervals' else previous_query
+        cursor.execute(query, (apartment, list(set(fingerprints)), INCREMENTAL_MAX_AGE_DAYS))
+        rows = cursor.fetchall()
+    return {fingerprint: {'rent': rent, 'available_date': available_date} for fingerprint, rent, available_date in rows}
+
+
+def _format_rent(rent):
+    return None if rent is None else f'{rent:g}'
+
+
+def lease_details_from_snapshot(previous):
+    """Stored row -> (availability, rent) in the same text form the lease page gives."""
+    available_date = previous['available_date']
+    return available_date.strftime('%m/%d/%Y') if available_date else None, _format_rent(previous['rent'])
+
+
+def rent_from_snapshot(previous):
+    return _format_rent(previous['rent'])
+
+
+def crawl_changed(df, apartment, fetch, from_snapshot=lease_details_from_snapshot, archive_site='lease'):
+    """
+    Fetch detail pages only for listing rows that are new or changed since the last stored snapshot.
+    Adds a Fingerprint column to df, repeated hrefs are fetched once.
+    :param apartment: apartment name the rows are stored under
+    :param fetch: function that takes a detail link and returns its details
+    :param from_snapshot: turns a stored row into the value fetch would have returned
+    :param archive_site: site the detail pages are archived under, reused pages are carried into this run
+    :return: detail values in the same order as the rows of df, None for failed pages
+    """
+    df['Fingerprint'] = fingerprint_rows(df)
+
+    previous = {}
+    if INCREMENTAL and not archive.replaying and len(df):
+        try:
+            previous = load_previous(apartment, df['Fingerprint'].tolist())
+        except Exception as e:
+            logger.warning(f"Could not load the last snapshot of {apartment}, fetching every unit: {e}")
+
+    values = [None] * len(df)
+    to_fetch = {}
+    for position, (fingerprint, link) in enumerate(zip(df['Fingerprint'], df['href'])):
+        if fingerprint in previous:
+            values[position] = from_snapshot(previous[fingerprint])
+            # keep the page the reused values came from replayable with this run
+            archive.carry_forward(archive_site, link)
+        else:
+            to_fetch.setdefault(link, []).append(position)
+
+    for result in crawl_details(list(to_fetch), fetch):
+        for position in to_fetch[result.link]:
+            values[position] = result.value
+
+    logger.info(
+        f"{apartment}: {len(df) - sum(len(p) for p in to_fetch.values())} unchanged units reused, "
+        f"{len(to_fetch)} detail pages fetched for {sum(len(p) for p in to_fetch.values())} new or changed units"
+    )
+    return values
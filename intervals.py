@@ -0,0 +1,147 @@
+import sys
+
+from settings import STORAGE_MODEL
+from utils import prepare_rows, _copy_batch
+from stats import update_daily_stats
+from log import logger
+
+# NOTE: interval storage model
+# instead of appending every unit on every scrape, listing_intervals keeps one row per listing state with the
+# first and last run it was seen in; a scrape extends last_seen of units that are unchanged since the
+# apartment's previous run and opens a new interval for new or changed units; runs and intervals are kept per
+# source, an apartments.com scrape of a building never extends or interrupts the intervals of its own website
+# runs of an apartment have to be stored oldest first, a run written in several batches (they share its retrieved)
+# is merged batch by batch; availability_snapshots rebuilds the per-scrape rows
+#   python intervals.py --backfill   convert the rows in availabilities into intervals
+
+STATE_COLUMNS = ['plan', 'bedrooms', 'beds', 'baths', 'sqft', 'rent', 'available_date']
+
+create_staging = """
+CREATE TEMP TABLE listing_staging (
+    apartment VARCHAR(100), plan VARCHAR(50), unit VARCHAR(50), bedrooms VARCHAR(100),
+    beds FLOAT, baths FLOAT, sqft FLOAT, rent FLOAT, available_date DATE, retrieved TIMESTAMP,
+    fingerprint VARCHAR(64), source VARCHAR(50)
+) ON COMMIT DROP;
+"""
+
+# the run before this one, and the last stored run; a run is written in several batches, all with its retrieved
+previous_run_query = """
+SELECT max(retrieved) FILTER (WHERE retrieved < %(retrieved)s), max(retrieved)
+FROM scrape_runs WHERE apartment = %(apartment)s AND source = %(source)s;
+"""
+
+# unchanged units that were listed in the previous run keep their interval
+extend_query = f"""
+UPDATE listing_intervals i
+SET last_seen = s.retrieved, fingerprint = s.fingerprint
+FROM listing_staging s
+WHERE s.apartment = %(apartment)s AND s.source = %(source)s AND s.retrieved = %(retrieved)s
+  AND i.apartment = s.apartment AND i.source = s.source AND i.unit = s.unit AND i.last_seen = %(previous)s
+  AND ({', '.join(f'i.{c}' for c in STATE_COLUMNS)}) IS NOT DISTINCT FROM ({', '.join(f's.{c}' for c in STATE_COLUMNS)});
+"""
+
+open_query = """
+INSERT INTO listing_intervals (apartment, plan, unit, bedrooms, beds, baths, sqft, rent, available_date,
+                               fingerprint, source, first_seen, last_seen)
+SELECT s.apartment, s.plan, s.unit, s.bedrooms, s.beds, s.baths, s.sqft, s.rent, s.available_date,
+       s.fingerprint, s.source, s.retrieved, s.retrieved
+FROM listing_staging s
+WHERE s.apartment = %(apartment)s AND s.source = %(source)s AND s.retrieved = %(retrieved)s
+  AND NOT EXISTS (
+      SELECT 1 FROM listing_intervals i
+      WHERE i.apartment = s.apartment AND i.source = s.source AND i.unit = s.unit AND i.last_seen = s.retrieved
+  );
+"""
+
+record_run_query = """
+INSERT INTO scrape_runs (apartment, source, retrieved, rows)
+SELECT apartment, source, retrieved, count(*) FROM listing_staging
+WHERE apartment = %(apartment)s AND source = %(source)s AND retrieved = %(retrieved)s
+GROUP BY apartment, source, retrieved
+ON CONFLICT (apartment, source, retrieved) DO UPDATE SET rows = scrape_runs.rows + EXCLUDED.rows;
+"""
+
+stage_snapshot_query = """
+INSERT INTO listing_staging
+SELECT apartment, plan, unit, bedrooms, beds, baths, sqft, rent, available_date, retrieved, fingerprint, source
+FROM availabilities WHERE apartment = %s AND source = %s AND retrieved = %s;
+"""
+
+
+def _apply_run(cursor, apartment, source, retrieved):
+    """
+    Merge the staged rows of one run (or one more batch of it) into listing_intervals.
+    :return: (extended, opened), or None if skipped
+    """
+    params = {'apartment': apartment, 'source': source, 'retrieved': retrieved}
+    cursor.execute(previous_run_query, params)
+    previous, last = cursor.fetchone()
+    if last is not None and last > retrieved:
+        logger.warning(f"{apartment} ({source}): run {retrieved} is older than the last stored run {last}, skipped")
+        return None
+
+    params['previous'] = previous
+    cursor.execute(extend_query, params)
+    extended = cursor.rowcount
+    cursor.execute(open_query, params)
+    opened = cursor.rowcount
+    cursor.execute(record_run_query, params)
+    return extended, opened
+
+
+def insert_intervals(conn, data):
+    """
+    Store a cleaned spider dataframe as listing intervals, in one transaction.
+    :return: number of rows in the dataframe
+    """
+    rows = prepare_rows(data)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(create_staging)
+            _copy_batch(cursor, rows, 'listing_staging')
+            for (apartment, source, retrieved), run_rows in rows.groupby(['apartment', 'source', 'retrieved']):
+                result = _apply_run(cursor, apartment, source, retrieved.to_pydatetime())
+                if result is not None:
+                    update_daily_stats(cursor, run_rows)
+                    logger.info(f"{apartment} ({source}): {result[0]} unchanged units extended, "
+                                f"{result[1]} intervals opened")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    print("Data inserted successfully into the database.")
+    return len(rows)
+
+
+def backfill_from_snapshots(conn):
+    """Replay every run stored in availabilities into listing_intervals, oldest first, one transaction per run."""
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT DISTINCT apartment, source, retrieved FROM availabilities ORDER BY retrieved')
+        runs = cursor.fetchall()
+    conn.commit()
+
+    for number, (apartment, source, retrieved) in enumerate(runs, 1):
+        with conn.cursor() as cursor:
+            cursor.execute(create_staging)
+            cursor.execute(stage_snapshot_query, (apartment, source, retrieved))
+            _apply_run(cursor, apartment, source, retrieved)
+        conn.commit()
+        if number % 100 == 0:
+            logger.info(f"Backfilled {number} of {len(runs)} runs")
+
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT (SELECT count(*) FROM availabilities), (SELECT count(*) FROM listing_intervals)')
+        snapshots, intervals = cursor.fetchone()
+    conn.commit()
+    logger.info(f"Backfilled {len(runs)} runs: {snapshots} snapshot rows stored as {intervals} intervals")
+
+
+if __name__ == '__main__':
+    from config import db
+
+    if '--backfill' not in sys.argv:
+        sys.exit('usage: python intervals.py --backfill')
+    if STORAGE_MODEL != 'intervals':
+        logger.warning("STORAGE_MODEL is not 'intervals', new runs will still be stored as snapshots")
+    with db.connection() as conn:
+        backfill_from_snapshots(conn)
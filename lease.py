@@ -0,0 +1,128 @@
+import threading
+from collections import Counter
+
+from lxml import html as lxml_html
+
+from settings import PAGE_WAIT, PAGE_POLL
+from fetcher import http_get
+from archive import archive
+from metrics import metrics
+from extract import inner_text
+from log import logger
+
+# NOTE: RentCafe lease pages (divTermInfo) are shared by Eleven40, ELLE, Grand Central, LINEA and Reed
+# the page is usually server-rendered, so a plain GET is enough, chrome is only the fallback
+
+# how often each path was taken: http, browser, failed
+lease_stats = Counter()
+_stats_lock = threading.Lock()
+
+# the move-in date is often filled in by script, so it is only in the input's value property, which
+# page_source doesn't serialize; one round trip reads the live values, and copies the date into the value
+# attribute first so the archived html replays the same; the pricing block is read as rendered lines, like
+# WebElement.text
+LEASE_SCRIPT = """
+const input = document.querySelector('#divTermInfo #DateDiv input');
+const pricing = document.querySelector('#divTermInfo #divPricingInfo');
+if (input) input.setAttribute('value', input.value);
+return {
+    dates: input && input.value ? [input.value] : [],
+    pricing: pricing ? pricing.innerText.split('\\n') : [],
+    html: document.documentElement.outerHTML,
+};
+"""
+
+
+def _count(path):
+    with _stats_lock:
+        lease_stats[path] += 1
+
+
+@metrics.timed('parse')
+def parse_lease_page(page):
+    """
+    Read the available date and 12-month rent from the html of a lease page.
+    :return: (availability, rent), or None if the lease info is not in the html
+    """
+    tree = lxml_html.fromstring(page)
+    term_info = tree.xpath('//*[@id="divTermInfo"]')
+    if not term_info:
+        return None
+
+    dates = term_info[0].xpath('.//*[@id="DateDiv"]//input/@value')
+    pricing = term_info[0].xpath('.//*[@id="divPricingInfo"]')
+    return _lease_details(dates, inner_text(pricing[0]).split('\n') if pricing else [])
+
+
+def _lease_details(dates, pricing_lines):
+    """The first move-in date and the second rendered line of the pricing block (the 12-month rent), or None."""
+    rent_lines = [line.strip() for line in pricing_lines if line.strip()]
+    if not dates or len(rent_lines) < 2:
+        return None
+    return dates[0], rent_lines[1]
+
+
+def _fetch_with_browser(link):
+    # imported here so a run that never needs the fallback doesn't start the driver pool
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from driver_pool import driver_pool
+
+    with driver_pool.lease('lease') as driver:
+        with metrics.timer('page_load', 'lease'):
+            driver.get(link)
+        # the page loads eagerly, so wait for the pricing block instead of the load event
+        with metrics.timer('wait', 'lease'):
+            WebDriverWait(driver, PAGE_WAIT, poll_frequency=PAGE_POLL).until(
+                EC.presence_of_element_located((By.ID, 'divPricingInfo'))
+            )
+        # one script instead of a find_element / get_attribute / text round trip per field
+        result = driver.execute_script(LEASE_SCRIPT)
+
+    page = result['html']
+    metrics.count('pages_fetched', site='lease')
+    metrics.count('browser_pages', site='lease')
+    metrics.count('bytes_downloaded', len(page.encode('utf-8')), site='lease')
+    archive.record('lease', link, page)
+    details = _lease_details(result['dates'], result['pricing'])
+    if details is None:
+        # counted as failed by fetch_lease_details
+        raise ValueError('no move-in date or 12-month rent on the rendered lease page')
+    return details
+
+
+def fetch_lease_details(link):
+    """Fetch the available date and 12-month rent of a unit, over http first and with chrome if needed."""
+    if archive.replaying:
+        return parse_lease_page(archive.lookup('lease', link)) or (None, None)
+
+    try:
+        page = http_get(link, 'lease')
+        details = parse_lease_page(page)
+        if details is not None:
+            _count('http')
+            archive.record('lease', link, page)
+            return details
+    except Exception as e:
+        logger.warning(f"lease: plain http fetch failed for {link} ({e}), falling back to browser")
+
+    metrics.count('retries', site='lease')
+    try:
+        details = _fetch_with_browser(link)
+        _count('browser')
+        return details
+    except Exception as e:
+        logger.error(f"Error fetching unit details: {e}")
+        _count('failed')
+        metrics.count('detail_failures', site='lease')
+        return None, None
+
+
+def log_lease_stats():
+    with _stats_lock:
+        stats = dict(lease_stats)
+    logger.info(
+        f"Lease pages: {stats.get('http', 0)} over http, {stats.get('browser', 0)} with browser, "
+        f"{stats.get('failed', 0)} failed"
+    )
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import functools
+import inspect
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from settings import METRICS_DIR, METRICS_PREFIX
+from log import logger
+
+# NOTE: run metrics
+# stage timers and counters per site, for the whole process; run.py writes them at the end of a run as
+# a Prometheus text file (for node_exporter's textfile collector) and a JSON report under METRICS_DIR
+#   with metrics.timer('parse'): ...          time a stage
+#   @metrics.timed('parse')                   time every call of a function (every item of a generator)
+#   metrics.count('pages_fetched')            add to a counter
+# the site is taken from the innermost metrics.scope(site), run.py opens one per spider and crawl_details
+# carries it into its worker threads; outside a scope the site passed to count/timer is used
+# stages: driver_start, http, page_load, wait (for the target element), host_wait (pacing), parse, clean, insert
+
+COUNTERS = {
+    'pages_fetched': 'Pages fetched over http or with the browser.',
+    'browser_pages': 'Pages that needed the browser.',
+    'bytes_downloaded': 'Bytes of http response bodies and rendered browser html.',
+    'units_parsed': 'Units read from the listing pages, before validation.',
+    'rows_inserted': 'Rows written to the database.',
+    'retries': 'Pages fetched again another way and inserts retried after a failure.',
+    'detail_failures': 'Detail pages that could not be fetched.',
+}
+
+_site = contextvars.ContextVar('metrics_site', default=None)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics(object):
+    """Thread-safe counters and stage timers keyed by site."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = datetime.now()
+        self._start = time.perf_counter()
+        self._counters = defaultdict(int)
+        # (site, stage) -> [calls, seconds]
+        self._stages = defaultdict(lambda: [0, 0.0])
+
+    def reset(self):
+        with self._lock:
+            self.started = datetime.now()
+            self._start = time.perf_counter()
+            self._counters.clear()
+            self._stages.clear()
+
+    @contextmanager
+    def scope(self, site):
+        """Attribute everything counted in the with-block, in this thread, to site."""
+        token = _site.set(site)
+        try:
+            yield
+        finally:
+            _site.reset(token)
+
+    def bind(self, func):
+        """Return func running in the current scope, for calls made from other threads."""
+        site = _site.get()
+
+        @functools.wraps(func)
+        def bound(*args, **kwargs):
+            with self.scope(site):
+                return func(*args, **kwargs)
+        return bound
+
+    def current_site(self, site=None):
+        return _site.get() or site or 'unknown'
+
+    def count(self, name, value=1, site=None):
+        with self._lock:
+            self._counters[(self.current_site(site), name)] += value
+
+    def add_time(self, stage, seconds, site=None):
+        with self._lock:
+            entry = self._stages[(self.current_site(site), stage)]
+            entry[0] += 1
+            entry[1] += seconds
+
+    @contextmanager
+    def timer(self, stage, site=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start, site)
+
+    def timed(self, stage):
+        """Decorator timing every call under stage; for a generator function, the time spent producing items."""
+        def decorator(func):
+            if inspect.isgeneratorfunction(func):
+                @functools.wraps(func)
+                def generator(*args, **kwargs):
+                    items = func(*args, **kwargs)
+                    while True:
+                        with self.timer(stage):
+                            try:
+                                item = next(items)
+                            except StopIteration:
+                                return
+                        yield item
+                return generator
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def report(self, run_id=None, summary=None):
+        """
+        The run so far as a dict: per site its counters and, per stage, the calls and seconds spent.
+        :param summary: extra per-site rows to include, e.g. the run.py summary
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            stages = {key: list(value) for key, value in self._stages.items()}
+            started = self.started
+            duration = time.perf_counter() - self._start
+
+        sites = defaultdict(lambda: {'counters': {}, 'stages': {}})
+        for (site, name), value in counters.items():
+            sites[site]['counters'][name] = value
+        for (site, stage), (calls, seconds) in stages.items():
+            sites[site]['stages'][stage] = {'calls': calls, 'seconds': round(seconds, 4)}
+        return {
+            'run_id': run_id,
+            'started': started.isoformat(timespec='seconds'),
+            'duration': round(duration, 2),
+            'sites': dict(sorted(sites.items())),
+            'summary': summary or [],
+        }
+
+    def prometheus(self, report):
+        """Render a report in the Prometheus text exposition format, values are of the last run."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            if not samples:
+                return
+            name = f'{METRICS_PREFIX}_{name}'
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                labels = ','.join(f'{key}="{_label(label)}"' for key, label in labels.items())
+                lines.append(f'{name}{{{labels}}} {value:.15g}' if labels else f'{name} {value:.15g}')
+
+        sites = report['sites']
+        for name, help_text in COUNTERS.items():
+            samples = [({'site': site}, data['counters'][name]) for site, data in sites.items()
+                       if name in data['counters']]
+            metric(name, 'gauge', f'{help_text} Last run.', samples)
+        stages = [(site, stage, values) for site, data in sites.items() for stage, values in data['stages'].items()]
+        metric('stage_seconds', 'gauge', 'Seconds spent per stage, summed over threads. Last run.',
+               [({'site': site, 'stage': stage}, values['seconds']) for site, stage, values in stages])
+        metric('stage_calls', 'gauge', 'Times a stage ran. Last run.',
+               [({'site': site, 'stage': stage}, values['calls']) for site, stage, values in stages])
+        metric('run_duration_seconds', 'gauge', 'Wall time of the last run.', [({}, report['duration'])])
+        metric('run_started_timestamp_seconds', 'gauge', 'Start time of the last run.',
+               [({}, datetime.fromisoformat(report['started']).timestamp())])
+        metric('site_rows', 'gauge', 'Rows written per site. Last run.',
+               [({'site': row['site']}, row['rows']) for row in report['summary'] if row.get('rows') is not None])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, run_id=None, summary=None, directory=METRICS_DIR):
+        """
+        Write the JSON report to <directory>/runs/<run_id>.json and the Prometheus text file to
+        <directory>/<METRICS_PREFIX>.prom, both replaced atomically.
+        :return: the report
+        """
+        report = self.report(run_id, summary)
+        run_id = run_id or self.started.strftime('%Y%m%d-%H%M%S')
+        os.makedirs(os.path.join(directory, 'runs'), exist_ok=True)
+        _write_atomic(os.path.join(directory, 'runs', f'{run_id}.json'), json.dumps(report, indent=2, default=str))
+        # node_exporter must never read a half-written file
+        _write_atomic(os.path.join(directory, f'{METRICS_PREFIX}.prom'), self.prometheus(report))
+        return report
+
+    def log_stats(self, report=None):
+        report = report or self.report()
+        for site, data in report['sites'].items():
+            stages = ', '.join(f"{stage} {values['seconds']:.1f}s" for stage, values in
+                               sorted(data['stages'].items(), key=lambda item: -item[1]['seconds']))
+            counters = ', '.join(f"{name} {value:g}" for name, value in sorted(data['counters'].items()))
+            logger.info(f"Metrics {site}: {stages or 'no stages'}; {counters or 'no counters'}")
+
+
+def _write_atomic(path, text):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+metrics = Metrics()
@@ -0,0 +1,139 @@
+import os
+import sys
+import argparse
+import importlib.util
+
+import pandas as pd
+
+from settings import MIGRATIONS_DIR, PARTITION_MONTHS_AHEAD
+from config import db
+from log import logger
+
+# NOTE: versioned schema migrations
+# migrations/NNNN_name.sql runs in one transaction, migrations/NNNN_name.py defines migrate(conn) and manages
+# its own transactions (e.g. to copy data in batches); applied versions are recorded in schema_migrations
+#   python migrate.py            apply pending migrations and create upcoming partitions
+#   python migrate.py --status   list applied and pending migrations
+# availabilities is partitioned by month, run migrate.py at least every PARTITION_MONTHS_AHEAD months;
+# rows past the last partition land in the default partition and are moved out by the next run
+
+# any constant works, it only keeps two migrate.py processes from running at the same time
+MIGRATION_LOCK = 7260113
+
+create_migrations_table = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(200) NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT now()
+);
+"""
+
+
+def discover():
+    """Return [(version, name, path)] of the migration files, in version order."""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        stem, ext = os.path.splitext(filename)
+        if ext not in ('.sql', '.py') or not stem[:4].isdigit():
+            continue
+        migrations.append((int(stem[:4]), stem, os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
+
+
+def applied_versions(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(create_migrations_table)
+        cursor.execute('SELECT version FROM schema_migrations')
+        versions = {row[0] for row in cursor.fetchall()}
+    conn.commit()
+    return versions
+
+
+def is_partitioned(conn, table):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def ensure_partitions(conn, table='availabilities', prefix='availabilities', since=None,
+                      months_ahead=PARTITION_MONTHS_AHEAD):
+    """
+    Create the monthly partitions <prefix>_yYYYYmMM of table from since (default: this month) until
+    months_ahead months from now, plus <prefix>_default for anything outside them.
+    Rows that already landed in the default partition are moved into the new month.
+    Does not commit.
+    """
+    start = pd.Timestamp(since or pd.Timestamp.now()).to_period('M')
+    end = pd.Timestamp.now().to_period('M') + months_ahead
+    default = f'{prefix}_default'
+    with conn.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {default} PARTITION OF {table} DEFAULT')
+        for month in pd.period_range(start, end, freq='M'):
+            partition = f'{prefix}_y{month.year}m{month.month:02d}'
+            cursor.execute('SELECT to_regclass(%s)', (partition,))
+            if cursor.fetchone()[0] is not None:
+                continue
+            lower, upper = str(month.start_time.date()), str((month + 1).start_time.date())
+            # a partition can't be created over rows the default partition holds, so it is filled first
+            cursor.execute(f'CREATE TABLE {partition} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {default} WHERE retrieved >= %s AND retrieved < %s RETURNING *) '
+                f'INSERT INTO {partition} SELECT * FROM moved',
+                (lower, upper)
+            )
+            cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES FROM (%s) TO (%s)",
+                           (lower, upper))
+            logger.info(f"Created partition {partition}")
+
+
+def _apply(conn, version, name, path):
+    logger.info(f"Applying migration {name}")
+    if path.endswith('.sql'):
+        with open(path, encoding='utf-8') as f, conn.cursor() as cursor:
+            cursor.execute(f.read())
+    else:
+        spec = importlib.util.spec_from_file_location(f'migrations.{name}', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.migrate(conn)
+    with conn.cursor() as cursor:
+        cursor.execute('INSERT INTO schema_migrations (version, name) VALUES (%s, %s)', (version, name))
+    conn.commit()
+
+
+def migrate():
+    """Apply every pending migration in order, then make sure the upcoming partitions exist."""
+    with db.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK,))
+        try:
+            done = applied_versions(conn)
+            pending = [migration for migration in discover() if migration[0] not in done]
+            for version, name, path in pending:
+                _apply(conn, version, name, path)
+            if is_partitioned(conn, 'availabilities'):
+                ensure_partitions(conn)
+                conn.commit()
+            logger.info(f"Applied {len(pending)} migrations")
+        finally:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK,))
+
+
+def status():
+    with db.connection() as conn:
+        done = applied_versions(conn)
+    for version, name, _ in discover():
+        print(f"{'applied' if version in done else 'pending':<9}{name}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply database schema migrations.')
+    parser.add_argument('--status', action='store_true', help='list applied and pending migrations')
+    args = parser.parse_args(sys.argv[1:])
+    if args.status:
+        status()
+    else:
+        migrate()
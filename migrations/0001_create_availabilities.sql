@@ -0,0 +1,18 @@
+-- baseline: the table scripts.sql used to create, as a plain heap
+-- existing databases already have it and only gain the fingerprint column
+CREATE TABLE IF NOT EXISTS availabilities (
+    id SERIAL PRIMARY KEY,
+    apartment VARCHAR(100) NOT NULL,
+    plan VARCHAR(50),
+    unit VARCHAR(50) NOT NULL,
+    bedrooms VARCHAR(100) NOT NULL,
+    beds FLOAT NOT NULL,
+    baths FLOAT NOT NULL,
+    sqft FLOAT NOT NULL,
+    rent FLOAT,
+    available_date DATE NOT NULL,
+    retrieved TIMESTAMP NOT NULL,
+    fingerprint VARCHAR(64)
+);
+
+ALTER TABLE availabilities ADD COLUMN IF NOT EXISTS fingerprint VARCHAR(64);
@@ -0,0 +1,91 @@
+"""
+Convert availabilities into a table range-partitioned by month on retrieved.
+
+The rows are copied into availabilities_partitioned in batches by id, one transaction per batch, while the
+spiders keep writing to the old table. The final step locks the old table against writes, copies the rows
+that arrived in the meantime and swaps the names, so readers only ever see one complete table.
+The old heap is kept as availabilities_legacy, drop it once the new table is checked.
+The copy can be interrupted and resumed by running the migration again.
+"""
+from settings import MIGRATION_BATCH_SIZE
+from migrate import ensure_partitions, is_partitioned
+from log import logger
+
+COLUMNS = 'id, apartment, plan, unit, bedrooms, beds, baths, sqft, rent, available_date, retrieved, fingerprint'
+
+create_table = """
+CREATE TABLE IF NOT EXISTS availabilities_partitioned (
+    id INTEGER NOT NULL DEFAULT nextval('availabilities_id_seq'),
+    apartment VARCHAR(100) NOT NULL,
+    plan VARCHAR(50),
+    unit VARCHAR(50) NOT NULL,
+    bedrooms VARCHAR(100) NOT NULL,
+    beds FLOAT NOT NULL,
+    baths FLOAT NOT NULL,
+    sqft FLOAT NOT NULL,
+    rent FLOAT,
+    available_date DATE NOT NULL,
+    retrieved TIMESTAMP NOT NULL,
+    fingerprint VARCHAR(64),
+    PRIMARY KEY (id, retrieved)
+) PARTITION BY RANGE (retrieved);
+"""
+
+# indexes on the parent are created on every partition, current and future
+create_indexes = """
+CREATE INDEX IF NOT EXISTS availabilities_retrieved_brin ON availabilities_partitioned USING BRIN (retrieved);
+CREATE INDEX IF NOT EXISTS availabilities_apartment_beds_idx ON availabilities_partitioned (apartment, beds, retrieved);
+CREATE INDEX IF NOT EXISTS availabilities_apartment_unit_idx ON availabilities_partitioned (apartment, unit, retrieved);
+CREATE INDEX IF NOT EXISTS availabilities_apartment_fingerprint_idx
+    ON availabilities_partitioned (apartment, fingerprint, retrieved);
+"""
+
+copy_batch = f"""
+INSERT INTO availabilities_partitioned ({COLUMNS})
+SELECT {COLUMNS} FROM availabilities WHERE id > %s AND id <= %s;
+"""
+
+
+def _scalar(conn, query, params=None):
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        return cursor.fetchone()[0]
+
+
+def migrate(conn):
+    if is_partitioned(conn, 'availabilities'):
+        logger.info("availabilities is already partitioned")
+        return
+
+    with conn.cursor() as cursor:
+        cursor.execute(create_table)
+        cursor.execute(create_indexes)
+    first = _scalar(conn, 'SELECT min(retrieved) FROM availabilities')
+    ensure_partitions(conn, 'availabilities_partitioned', prefix='availabilities', since=first)
+    conn.commit()
+
+    # resume after the rows a previous, interrupted run already copied
+    copied = _scalar(conn, 'SELECT coalesce(max(id), 0) FROM availabilities_partitioned')
+    last = _scalar(conn, 'SELECT coalesce(max(id), 0) FROM availabilities')
+    conn.commit()
+    while copied < last:
+        with conn.cursor() as cursor:
+            cursor.execute(copy_batch, (copied, copied + MIGRATION_BATCH_SIZE))
+        conn.commit()
+        copied += MIGRATION_BATCH_SIZE
+        logger.info(f"Copied availabilities up to id {min(copied, last)} of {last}")
+
+    with conn.cursor() as cursor:
+        # reads continue during the swap, inserts wait for it
+        cursor.execute('LOCK TABLE availabilities IN EXCLUSIVE MODE')
+        cursor.execute(copy_batch, (copied, 2 ** 31 - 1))
+        cursor.execute('ALTER SEQUENCE availabilities_id_seq OWNED BY NONE')
+        cursor.execute('ALTER TABLE availabilities RENAME TO availabilities_legacy')
+        cursor.execute('ALTER INDEX IF EXISTS availabilities_pkey RENAME TO availabilities_legacy_pkey')
+        cursor.execute('ALTER TABLE availabilities_partitioned RENAME TO availabilities')
+        cursor.execute('ALTER INDEX availabilities_partitioned_pkey RENAME TO availabilities_pkey')
+        cursor.execute('ALTER TABLE availabilities_legacy ALTER COLUMN id DROP DEFAULT')
+        cursor.execute('ALTER SEQUENCE availabilities_id_seq OWNED BY availabilities.id')
+        cursor.execute('ANALYZE availabilities')
+    conn.commit()
+    logger.info("availabilities is now partitioned by month, the old table is kept as availabilities_legacy")
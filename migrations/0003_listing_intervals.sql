@@ -0,0 +1,37 @@
+-- interval storage model (STORAGE_MODEL = 'intervals'): one row per listing state instead of one per scrape
+-- a state lasts from the first to the last run it was seen in, scrape_runs lists every run per apartment
+CREATE TABLE IF NOT EXISTS scrape_runs (
+    id SERIAL PRIMARY KEY,
+    apartment VARCHAR(100) NOT NULL,
+    retrieved TIMESTAMP NOT NULL,
+    rows INTEGER NOT NULL,
+    UNIQUE (apartment, retrieved)
+);
+
+CREATE TABLE IF NOT EXISTS listing_intervals (
+    id SERIAL PRIMARY KEY,
+    apartment VARCHAR(100) NOT NULL,
+    plan VARCHAR(50),
+    unit VARCHAR(50) NOT NULL,
+    bedrooms VARCHAR(100) NOT NULL,
+    beds FLOAT NOT NULL,
+    baths FLOAT NOT NULL,
+    sqft FLOAT NOT NULL,
+    rent FLOAT,
+    available_date DATE NOT NULL,
+    fingerprint VARCHAR(64),
+    first_seen TIMESTAMP NOT NULL,
+    last_seen TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS listing_intervals_unit_idx ON listing_intervals (apartment, unit, last_seen);
+CREATE INDEX IF NOT EXISTS listing_intervals_seen_idx ON listing_intervals (apartment, first_seen, last_seen);
+CREATE INDEX IF NOT EXISTS listing_intervals_fingerprint_idx ON listing_intervals (apartment, fingerprint, last_seen);
+
+-- the classic one-row-per-unit-per-scrape rows, with the same columns as availabilities
+CREATE OR REPLACE VIEW availability_snapshots AS
+SELECT i.id, i.apartment, i.plan, i.unit, i.bedrooms, i.beds, i.baths, i.sqft, i.rent, i.available_date,
+       r.retrieved, i.fingerprint
+FROM scrape_runs r
+JOIN listing_intervals i
+  ON i.apartment = r.apartment AND r.retrieved BETWEEN i.first_seen AND i.last_seen;
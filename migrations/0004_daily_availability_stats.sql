@@ -0,0 +1,32 @@
+-- per-day aggregates of the scraped rows, kept up to date by every insert (see stats.py)
+-- sums and counts instead of means so a new batch can be added to a day without rereading it
+CREATE TABLE IF NOT EXISTS daily_availability_stats (
+    retrieved_date DATE NOT NULL,
+    apartment VARCHAR(100) NOT NULL,
+    beds FLOAT NOT NULL,
+    units INTEGER NOT NULL,
+    rent_units INTEGER NOT NULL,
+    rent_sum FLOAT,
+    rent_min FLOAT,
+    rent_max FLOAT,
+    sqft_sum FLOAT,
+    rent_per_sqft_units INTEGER NOT NULL,
+    rent_per_sqft_sum FLOAT,
+    PRIMARY KEY (retrieved_date, apartment, beds)
+);
+
+-- means derived from the sums
+CREATE OR REPLACE VIEW daily_availability AS
+SELECT retrieved_date, apartment, beds, units,
+       rent_sum / NULLIF(rent_units, 0) AS mean_rent,
+       rent_min, rent_max,
+       sqft_sum / NULLIF(units, 0) AS mean_sqft,
+       rent_per_sqft_sum / NULLIF(rent_per_sqft_units, 0) AS mean_rent_per_sqft
+FROM daily_availability_stats;
+
+INSERT INTO daily_availability_stats
+SELECT retrieved::date, apartment, beds, count(*), count(rent), sum(rent), min(rent), max(rent), sum(sqft),
+       count(rent / NULLIF(sqft, 0)), sum(rent / NULLIF(sqft, 0))
+FROM availabilities
+GROUP BY retrieved::date, apartment, beds
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,11 @@
+-- where a row was scraped from: 'official' for the building's own website, or an aggregator such as
+-- 'apartments.com' (see apartments_com/aggregator.py); existing rows all came from the official sites
+ALTER TABLE availabilities ADD COLUMN IF NOT EXISTS source VARCHAR(50) NOT NULL DEFAULT 'official';
+ALTER TABLE listing_intervals ADD COLUMN IF NOT EXISTS source VARCHAR(50) NOT NULL DEFAULT 'official';
+
+CREATE OR REPLACE VIEW availability_snapshots AS
+SELECT i.id, i.apartment, i.plan, i.unit, i.bedrooms, i.beds, i.baths, i.sqft, i.rent, i.available_date,
+       r.retrieved, i.fingerprint, i.source
+FROM scrape_runs r
+JOIN listing_intervals i
+  ON i.apartment = r.apartment AND r.retrieved BETWEEN i.first_seen AND i.last_seen;
@@ -0,0 +1,66 @@
+"""
+Key the daily aggregates, the scrape runs and the snapshot view by source as well as by apartment.
+
+The aggregator stores its rows under the apartment names of the official spiders, so without the source a
+building's apartments.com listing would be counted into the figures of its own website and would start and
+end its listing intervals. Rows the aggregator stored before under its apartments.com slugs (the names in
+apartments_com/apt_com.py) are renamed to their apartments, and as they had been counted as official rows,
+the aggregates are then recomputed once.
+"""
+from settings import AGGREGATOR_SOURCE
+from apartments_com.apt_com import APT_INFO_LIST
+from stats import rebuild_daily_stats
+from log import logger
+
+schema = """
+ALTER TABLE daily_availability_stats ADD COLUMN IF NOT EXISTS source VARCHAR(50) NOT NULL DEFAULT 'official';
+ALTER TABLE daily_availability_stats DROP CONSTRAINT IF EXISTS daily_availability_stats_pkey;
+ALTER TABLE daily_availability_stats ADD PRIMARY KEY (retrieved_date, apartment, beds, source);
+
+CREATE OR REPLACE VIEW daily_availability AS
+SELECT retrieved_date, apartment, beds, units,
+       rent_sum / NULLIF(rent_units, 0) AS mean_rent,
+       rent_min, rent_max,
+       sqft_sum / NULLIF(units, 0) AS mean_sqft,
+       rent_per_sqft_sum / NULLIF(rent_per_sqft_units, 0) AS mean_rent_per_sqft,
+       source
+FROM daily_availability_stats;
+
+ALTER TABLE scrape_runs ADD COLUMN IF NOT EXISTS source VARCHAR(50) NOT NULL DEFAULT 'official';
+ALTER TABLE scrape_runs DROP CONSTRAINT IF EXISTS scrape_runs_apartment_retrieved_key;
+ALTER TABLE scrape_runs DROP CONSTRAINT IF EXISTS scrape_runs_apartment_source_retrieved_key;
+ALTER TABLE scrape_runs ADD CONSTRAINT scrape_runs_apartment_source_retrieved_key UNIQUE (apartment, source, retrieved);
+
+CREATE OR REPLACE VIEW availability_snapshots AS
+SELECT i.id, i.apartment, i.plan, i.unit, i.bedrooms, i.beds, i.baths, i.sqft, i.rent, i.available_date,
+       r.retrieved, i.fingerprint, i.source
+FROM scrape_runs r
+JOIN listing_intervals i
+  ON i.apartment = r.apartment AND i.source = r.source AND r.retrieved BETWEEN i.first_seen AND i.last_seen;
+"""
+
+rename_rows = """
+UPDATE {table} SET apartment = %(apartment)s WHERE apartment = %(slug)s AND source <> 'official';
+"""
+
+# runs had no source yet, the slugs only ever named aggregator runs
+rename_runs = """
+UPDATE scrape_runs SET apartment = %(apartment)s, source = %(source)s WHERE apartment = %(slug)s;
+"""
+
+
+def migrate(conn):
+    renamed = 0
+    with conn.cursor() as cursor:
+        cursor.execute(schema)
+        for building in APT_INFO_LIST:
+            params = {'slug': building['name'], 'apartment': building['apartment'], 'source': AGGREGATOR_SOURCE}
+            for table in ('availabilities', 'listing_intervals'):
+                cursor.execute(rename_rows.format(table=table), params)
+                renamed += cursor.rowcount
+            cursor.execute(rename_runs, params)
+    conn.commit()
+
+    if renamed:
+        logger.info(f"Renamed {renamed} rows of the aggregator to their apartments")
+        rebuild_daily_stats(conn)
@@ -0,0 +1,118 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:     # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+# NOTE: declarative field normalization
+# each spider declares its fields as rules, e.g.
+#   FIELD_RULES = {
+#       'Unit': text(remove=['Apt #:']),
+#       'Beds': number(keywords={'Studio': 0, 'Convertible': 0}),
+#       'Availability': date(remove=['Available:'], now=['Now']),
+#   }
+#   df = normalize(df, FIELD_RULES, now=archive.now())
+# a column holds only a handful of distinct strings (the same floor plans and prices on every row), so every
+# rule runs its compiled regexes once per distinct value and the results are spread back over the rows
+
+NUMBER = re.compile(r'-?\d[\d,]*(?:\.\d+)?')
+
+
+class Rule(object):
+    """
+    How to turn the raw text of one field into a value.
+    :param kind: 'text', 'number' or 'date'
+    :param source: column the raw text is read from, the target column by default
+    :param remove: substrings removed anywhere in the text, surrounding whitespace is always stripped
+    :param pattern: regex whose first group is the part of the text to use, the whole text if it doesn't match
+    :param keywords: {substring: value}, the first substring found decides the value (e.g. {'Studio': 0})
+    :param now: words meaning available today (e.g. 'Now'), date rules only
+    """
+
+    def __init__(self, kind, source=None, remove=(), pattern=None, keywords=None, now=()):
+        self.kind = kind
+        self.source = source
+        self._remove = re.compile('|'.join(re.escape(token) for token in remove)) if remove else None
+        self._pattern = re.compile(pattern) if pattern else None
+        self._keywords = list((keywords or {}).items())
+        self._now = list(now)
+        # date format guessed from the first value and reused while it keeps parsing
+        self._format = None
+
+    def clean(self, value):
+        if not isinstance(value, str):
+            value = str(value)
+        if self._pattern is not None:
+            match = self._pattern.search(value)
+            if match:
+                value = match.group(1)
+        if self._remove is not None:
+            value = self._remove.sub('', value)
+        return value.strip()
+
+    def _number(self, value):
+        for keyword, mapped in self._keywords:
+            if keyword in value:
+                return mapped
+        match = NUMBER.search(value)
+        return float(match.group().replace(',', '')) if match else np.nan
+
+    def _dates(self, values, now):
+        """Parse cleaned date strings, words in self._now become the date of now."""
+        is_now = np.array([any(word in value for word in self._now) for value in values], dtype=bool)
+        values = pd.Series(values, dtype=object).mask(is_now, None)
+
+        if self._format is None and values.notna().any():
+            self._format = guess_datetime_format(values.dropna().iloc[0])
+        parsed = pd.to_datetime(values, format=self._format, errors='coerce') if self._format else \
+            pd.Series(pd.NaT, index=values.index)
+        failed = parsed.isna() & values.notna() & (values != '')
+        if failed.any():
+            # the site changed its format, parse the rest one by one and guess again next time
+            self._format = None
+            parsed[failed] = pd.to_datetime(values[failed], format='mixed', errors='coerce')
+        if is_now.any():
+            parsed[is_now] = pd.Timestamp(pd.Timestamp(now or pd.Timestamp.now()).date())
+        return parsed.to_numpy(dtype='datetime64[ns]')
+
+    def apply(self, column, now=None):
+        """Normalize a column, returning a Series with the same index."""
+        if self.kind == 'date' and pd.api.types.is_datetime64_any_dtype(column):
+            return column
+        codes, uniques = pd.factorize(column)
+        cleaned = [self.clean(value) for value in uniques]
+
+        if self.kind == 'text':
+            values = np.array(cleaned + [None], dtype=object)
+        elif self.kind == 'number':
+            values = np.array([self._number(value) for value in cleaned] + [np.nan], dtype=float)
+        else:
+            values = np.append(self._dates(cleaned, now), np.datetime64('NaT'))
+        # code -1 (missing) picks the trailing missing value
+        return pd.Series(values[codes], index=column.index)
+
+
+def text(source=None, remove=(), pattern=None):
+    return Rule('text', source, remove, pattern)
+
+
+def number(source=None, remove=(), pattern=None, keywords=None):
+    return Rule('number', source, remove, pattern, keywords)
+
+
+def date(source=None, remove=(), pattern=None, now=()):
+    return Rule('date', source, remove, pattern, now=now)
+
+
+def normalize(df, rules, now=None):
+    """
+    Return df with every column in rules replaced by its normalized values.
+    All rules read the columns as they were before normalizing, so one source can feed several fields.
+    :param now: the scrape time, used for 'available now' dates
+    """
+    columns = {target: rule.apply(df[rule.source or target], now) for target, rule in rules.items()}
+    return df.assign(**columns)
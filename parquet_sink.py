@@ -0,0 +1,102 @@
+import os
+import uuid
+
+import pandas as pd
+
+from settings import PARQUET_DIR, PARQUET_COMPRESSION
+from utils import prepare_rows
+from log import logger
+
+# NOTE: parquet dataset of scraped rows
+# every batch becomes one file under <root>/retrieved_date=YYYY-MM-DD/apartment=<name>/, typed and compressed;
+# read_dataset filters on the partition directories first, so reading one apartment over 90 days only
+# opens the files of those 90 days of that apartment, and only the requested columns are decoded
+
+PARTITION_COLUMNS = ['retrieved_date', 'apartment']
+
+
+def _schemas():
+    import pyarrow as pa
+
+    schema = pa.schema([
+        ('plan', pa.string()),
+        ('unit', pa.string()),
+        ('bedrooms', pa.string()),
+        ('beds', pa.float64()),
+        ('baths', pa.float64()),
+        ('sqft', pa.float64()),
+        ('rent', pa.float64()),
+        ('available_date', pa.date32()),
+        ('retrieved', pa.timestamp('us')),
+        ('fingerprint', pa.string()),
+        ('source', pa.string()),
+        ('retrieved_date', pa.date32()),
+        ('apartment', pa.string()),
+    ])
+    partitioning = pa.schema([('retrieved_date', pa.date32()), ('apartment', pa.string())])
+    return schema, partitioning
+
+
+def write_rows(rows, root=PARQUET_DIR):
+    """
+    Append rows with the availabilities columns (e.g. from utils.prepare_rows or the database) to the dataset.
+    :return: number of rows written
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema, _ = _schemas()
+    rows = rows.dropna(subset=['retrieved', 'apartment']).assign(
+        retrieved_date=lambda df: pd.to_datetime(df['retrieved']).dt.date,
+        available_date=lambda df: pd.to_datetime(df['available_date']).dt.date,
+    )
+    for column in schema.names:
+        if column not in rows.columns:
+            rows[column] = None
+    table = pa.Table.from_pandas(rows[schema.names], schema=schema, preserve_index=False)
+    pq.write_to_dataset(
+        table, root,
+        partition_cols=PARTITION_COLUMNS,
+        compression=PARQUET_COMPRESSION,
+        # a new name per batch, so batches of the same day and apartment sit side by side
+        basename_template=f'{uuid.uuid4().hex}-{{i}}.parquet',
+        existing_data_behavior='overwrite_or_ignore',
+    )
+    logger.debug(f"Wrote {table.num_rows} rows to {root}")
+    return table.num_rows
+
+
+def write_batch(data, root=PARQUET_DIR):
+    """Append a cleaned spider dataframe to the dataset."""
+    return write_rows(prepare_rows(data), root)
+
+
+def read_dataset(columns=None, apartments=None, start=None, end=None, root=PARQUET_DIR):
+    """
+    Read the dataset into a DataFrame.
+    :param columns: columns to read, all by default
+    :param apartments: only these apartments
+    :param start: first retrieved date to read, both start and end are included
+    :param end: last retrieved date to read
+    """
+    import pyarrow.dataset as ds
+
+    schema, partitioning = _schemas()
+    if not os.path.isdir(root):
+        return pd.DataFrame(columns=columns)
+    # files written before a column was added read it as nulls
+    dataset = ds.dataset(root, schema=schema, format='parquet',
+                         partitioning=ds.partitioning(partitioning, flavor='hive'))
+
+    conditions = []
+    if apartments:
+        conditions.append(ds.field('apartment').isin(list(apartments)))
+    if start is not None:
+        conditions.append(ds.field('retrieved_date') >= pd.Timestamp(start).date())
+    if end is not None:
+        conditions.append(ds.field('retrieved_date') <= pd.Timestamp(end).date())
+    condition = None
+    for expression in conditions:
+        condition = expression if condition is None else condition & expression
+
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
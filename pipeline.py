@@ -0,0 +1,134 @@
+import time
+
+import pandas as pd
+
+from settings import PIPELINE_BATCH_SIZE, PIPELINE_FLUSH_SECONDS, PARQUET_DIR
+from archive import archive
+from metrics import metrics
+from log import logger
+
+# NOTE: streaming listing pipeline
+# spiders yield their rows page by page (one floor plan table, one listing page) instead of concatenating
+# everything first; each chunk is cleaned and validated right away and buffered until PIPELINE_BATCH_SIZE rows
+# or PIPELINE_FLUSH_SECONDS have gone by, then the batch is handed to every sink, so rows reach the database
+# while the crawl is still running and a site never holds more than one batch
+# the scrape time is taken once when the pipeline is created and stamped on every chunk as Retrieved, so all
+# rows of one site run belong to the same scrape (latest snapshot, listing intervals, scrape_runs)
+# fetched pages don't pass through here, they are archived by the fetcher as they are downloaded
+
+LISTING_COLUMNS = ['Apartment', 'Plan', 'Unit', 'Bedrooms', 'Beds', 'Baths', 'Sq_ft', 'Rent', 'Availability',
+                   'Retrieved', 'Fingerprint', 'Source']
+# NOT NULL in availabilities, a row without them would fail the whole insert
+REQUIRED_COLUMNS = ['Apartment', 'Unit', 'Bedrooms', 'Beds', 'Baths', 'Sq_ft', 'Availability', 'Retrieved']
+
+
+def validate(df, site):
+    """Drop rows the database would reject and give every listing column its type."""
+    df = df[[column for column in LISTING_COLUMNS if column in df.columns]]
+    invalid = df[REQUIRED_COLUMNS].isna().any(axis=1)
+    if invalid.any():
+        logger.warning(f"{site}: dropped {invalid.sum()} rows missing one of {REQUIRED_COLUMNS}")
+        df = df[~invalid]
+    return df.astype({'Beds': float, 'Baths': float, 'Sq_ft': float, 'Rent': float})
+
+
+class DatabaseSink(object):
+    """Insert every batch into the database."""
+
+    def write(self, batch):
+        from config import db
+        from utils import insert_data
+
+        with metrics.timer('insert'), db.connection() as conn:
+            rows = insert_data(conn, batch)
+        metrics.count('rows_inserted', rows)
+
+
+class ParquetSink(object):
+    """Append every batch to the parquet dataset under root."""
+
+    def __init__(self, root=PARQUET_DIR):
+        self.root = root
+
+    def write(self, batch):
+        from parquet_sink import write_batch
+        write_batch(batch, root=self.root)
+
+
+class CollectSink(object):
+    """Keep the batches in memory, for callers that want the whole result as one DataFrame."""
+
+    def __init__(self):
+        self.batches = []
+
+    def write(self, batch):
+        self.batches.append(batch)
+
+    def frame(self):
+        return pd.concat(self.batches, ignore_index=True) if self.batches else pd.DataFrame(columns=LISTING_COLUMNS)
+
+
+def default_sinks(insert=True, sinks=()):
+    return ([DatabaseSink()] if insert else []) + list(sinks)
+
+
+class Pipeline(object):
+    """
+    Clean, validate and batch the row chunks a spider yields, and fan the batches out to the sinks.
+    :param site: name used in the logs
+    :param clean: the spider's clean_data(df, retrieved), called on every chunk
+    :param sinks: objects with a write(batch) method
+    :param retrieved: scrape time of the run, archive.now() when the pipeline is created by default
+    """
+
+    def __init__(self, site, clean, sinks, batch_size=PIPELINE_BATCH_SIZE, flush_interval=PIPELINE_FLUSH_SECONDS,
+                 retrieved=None):
+        self.site = site
+        self.clean = clean
+        self.retrieved = retrieved if retrieved is not None else archive.now()
+        self.sinks = list(sinks)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows = 0
+        self.batches = 0
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+
+    def _flush(self):
+        if self._buffer:
+            batch = pd.concat(self._buffer, ignore_index=True) if len(self._buffer) > 1 else self._buffer[0]
+            self._buffer, self._buffered = [], 0
+            for sink in self.sinks:
+                sink.write(batch)
+            self.rows += len(batch)
+            self.batches += 1
+            logger.debug(f"{self.site}: flushed {len(batch)} rows, {self.rows} so far")
+        self._last_flush = time.monotonic()
+
+    def feed(self, chunk):
+        """Clean and buffer one chunk of raw rows, flushing when the batch is full or old enough."""
+        if chunk is None or chunk.empty:
+            return
+        metrics.count('units_parsed', len(chunk))
+        with metrics.timer('clean'):
+            chunk = validate(self.clean(chunk, self.retrieved), self.site)
+        self._buffer.append(chunk)
+        self._buffered += len(chunk)
+        if self._buffered >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush()
+
+    def run(self, chunks):
+        """
+        Feed every chunk and flush the rest; rows cleaned before a failure are still written.
+        :return: number of rows written
+        """
+        # a spider run on its own counts under the pipeline's site, under run.py under the site it runs
+        with metrics.scope(metrics.current_site(self.site)):
+            try:
+                for chunk in chunks:
+                    self.feed(chunk)
+            finally:
+                self._flush()
+        logger.info(f"{self.site}: {self.rows} rows written in {self.batches} batches")
+        return self.rows
@@ -0,0 +1,62 @@
+import os
+import argparse
+
+import pandas as pd
+
+from archive import archive
+from pipeline import ParquetSink
+from log import logger
+from run import SITES
+
+# NOTE: re-run parsing and cleaning of every spider over archived pages, without browser or network
+# e.g. to backfill history after fixing a clean_data bug
+#   python replay.py --list
+#   python replay.py 20240801-060000 --sites linea nema
+#   python replay.py --all --insert
+
+REPLAY_OUTPUT = os.path.join('.', 'output', 'replay')
+
+
+def replay_run(run_id, sites=None, insert=False):
+    """Replay one archived run and return {site: rows}."""
+    archive.start_replay(run_id)
+    rows = {}
+    try:
+        recorded = archive.replay_sites()
+        for name in sites or SITES:
+            if name not in recorded:
+                continue
+            try:
+                sinks = [] if insert else [ParquetSink(root=os.path.join(REPLAY_OUTPUT, run_id))]
+                rows[name] = SITES[name](insert=insert, sinks=sinks)
+            except Exception as e:
+                logger.error(f"Replay of {name} in run {run_id} failed: {e}")
+    finally:
+        archive.stop_replay()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-parse archived pages offline.')
+    parser.add_argument('runs', nargs='*', help='run ids to replay')
+    parser.add_argument('--all', action='store_true', help='replay every archived run')
+    parser.add_argument('--list', action='store_true', help='list archived runs')
+    parser.add_argument('--sites', nargs='+', choices=list(SITES), help='only replay these sites')
+    parser.add_argument('--insert', action='store_true', help=f'insert into the database instead of {REPLAY_OUTPUT}')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(archive.runs()))
+        return
+
+    runs = archive.runs() if args.all else args.runs
+    summary = [
+        {'run': run_id, 'site': site, 'rows': rows}
+        for run_id in runs
+        for site, rows in replay_run(run_id, args.sites, args.insert).items()
+    ]
+    logger.info(f"Replayed {len(runs)} runs\n{pd.DataFrame(summary).to_string(index=False)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,78 @@
-import subprocess
-
-scripts = [
-    "./spider/list_1000m.py",
-    "./spider/list_1130.py",
-    "./spider/list_1140.py",
-    "./spider/list_elle.py",
-    "./spider/list_grandcentral.py",
-    "./spider/list_linea.py",
-    "./spider/list_nema.py",
-]
-
-for script in scripts:
-    print(f"Running {script}...")
-    subprocess.run(["python", script])
-    print(f"Finished {script}")
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from settings import SITE_WORKERS
+from driver_pool import driver_pool
+from lease import log_lease_stats
+from http_cache import http_cache
+from pipeline import ParquetSink
+from archive import archive
+from metrics import metrics
+from log import logger
+from spider.list_1000m import get_1000m_listings
+from spider.list_1130 import get_1130_listings
+from spider.list_1140 import get_1140_listings
+from spider.list_elle import get_elle_listings
+from spider.list_grandcentral import get_grand_central_listings
+from spider.list_linea import get_linea_listings
+from spider.list_nema import get_nema_listings
+
+# all spiders run in this process and share the db connection, driver pool and logger
+SITES = {
+    '1000m': get_1000m_listings,
+    '1130': get_1130_listings,
+    '1140': get_1140_listings,
+    'elle': get_elle_listings,
+    'grand_central': get_grand_central_listings,
+    'linea': get_linea_listings,
+    'nema': get_nema_listings,
+}
+
+
+def run_site(name):
+    """Run one spider and return its summary row, a failure never stops the other sites."""
+    logger.info(f"Running {name}...")
+    start = time.perf_counter()
+    summary = {'site': name, 'rows': 0, 'status': 'ok', 'error': None}
+    try:
+        # rows are written to the database and the parquet dataset batch by batch while the spider runs
+        with metrics.scope(name):
+            summary['rows'] = SITES[name](sinks=[ParquetSink()])
+        if not summary['rows']:
+            raise RuntimeError('spider wrote no rows')
+    except Exception as e:
+        logger.exception(f"{name} failed: {e}")
+        summary['status'] = 'failed'
+        summary['error'] = str(e)
+    summary['duration'] = round(time.perf_counter() - start, 1)
+    logger.info(f"Finished {name} in {summary['duration']}s")
+    return summary
+
+
+def run(sites=None, max_workers=SITE_WORKERS):
+    """Run the given sites concurrently and return the run summary as a DataFrame."""
+    sites = sites or list(SITES)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        summary = list(executor.map(run_site, sites))
+    summary = pd.DataFrame(summary, columns=['site', 'status', 'rows', 'duration', 'error'])
+
+    logger.info(f"Run finished in {time.perf_counter() - start:.1f}s\n{summary.to_string(index=False)}")
+    driver_pool.log_stats()
+    log_lease_stats()
+    http_cache.log_stats()
+    # where the wall time went, per site and stage
+    report = metrics.write(run_id=archive.run_id, summary=summary.to_dict('records'))
+    metrics.log_stats(report)
+    return summary
+
+
+if __name__ == '__main__':
+    # optionally pass site names to run a subset, e.g. python run.py nema linea
+    unknown = [name for name in sys.argv[1:] if name not in SITES]
+    if unknown:
+        sys.exit(f"Unknown sites: {', '.join(unknown)}. Choose from: {', '.join(SITES)}")
+    run(sys.argv[1:])
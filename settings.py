@@ -25,12 +25,111 @@ RANDOLPH_TOWER_URL = 'https://randolphtowercityapartments.com/apartment-floorpla
 ARRIVE_MICHIGAN_URL = 'https://arrivemichiganavenue.com/floorplans/'
 
 
+# startup
+# cache the chromedriver path and user agent list on this machine instead of resolving them on every run
+FAST_STARTUP = os.getenv('FAST_STARTUP', '1') == '1'
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'apartment_spider')
+DRIVER_PATH_CACHE = os.path.join(CACHE_DIR, 'chromedriver.json')
+USER_AGENT_CACHE = os.path.join(CACHE_DIR, 'user_agents.json')
+USER_AGENT_SAMPLES = 50
+
+
+# selenium driver pool
+DRIVER_POOL_SIZE = 4    # max number of browser sessions alive at the same time
+DRIVER_MAX_PAGES = 50   # recycle a browser session after this many leases
+
+# page-load profile
+PAGE_LOAD_STRATEGY = 'eager'    # don't wait for images/fonts, spiders wait for their own target element
+PAGE_POLL = 0.1                 # seconds between checks for the target element
+# persistent chrome profile so static assets come from the disk cache across runs, None to disable
+CHROME_PROFILE_DIR = os.getenv('CHROME_PROFILE_DIR')
+# url patterns blocked per content type
+BLOCKED_RESOURCES = {
+    'image': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico'],
+    'font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+    'stylesheet': ['*.css'],
+    'media': ['*.mp4', '*.webm', '*.mp3', '*.m3u8'],
+}
+# content types each site can load without, keyed like the fetch tiers; 'default' for the rest
+# the listing spiders parse page_source once their target element is there, which needs no images or css
+PAGE_PROFILES = {
+    'default': ['image', 'font', 'media', 'stylesheet'],
+    # the lease fallback reads the pricing block's innerText, whose lines and hidden text depend on the css
+    'lease': ['image', 'font', 'media'],
+}
+
+# unit detail crawling
+DETAIL_WORKERS = DRIVER_POOL_SIZE   # detail pages fetched in parallel per spider
+DETAIL_PER_HOST = 3                 # max detail requests in flight to the same host
+# min seconds between two requests to the same host, hosts not listed aren't paced
+HOST_INTERVAL = {
+    'www.apartments.com': 2.0,
+}
+
+# plain http fetching
+HTTP_TIMEOUT = 20       # seconds
+HTTP_POOL_SIZE = 16     # keep-alive connections per host in the shared session
+HTTP_CACHE_DIR = os.path.join(CACHE_DIR, 'http')
+# seconds a cached page is used without asking the server, after that it is revalidated (ETag/Last-Modified)
+HTTP_CACHE_TTL = {
+    'default': 10 * 60,
+    'lease': 0,
+}
+FETCH_TIER_CACHE = os.path.join(CACHE_DIR, 'fetch_tiers.json')  # per site: http or browser
+FETCH_TIER_REPROBE = 7 * 24 * 3600  # seconds before a browser site is tried over plain http again
+PAGE_WAIT = 10          # seconds to wait for the target element in the browser
+# parse listing pages only up to the end of the container the spider reads, see extract.parse_section
+PARTIAL_PARSE = os.getenv('PARTIAL_PARSE', '0') == '1'
+
+# incremental scraping, reuse the details of units whose listing row hasn't changed
+INCREMENTAL = os.getenv('INCREMENTAL', '1') == '1'
+INCREMENTAL_MAX_AGE_DAYS = 7    # only reuse details stored within this many days
+
+# page archive, every fetched page is kept so runs can be re-parsed offline
+ARCHIVE_PAGES = os.getenv('ARCHIVE_PAGES', '1') == '1'
+ARCHIVE_DIR = os.path.join(os.path.dirname(__file__), 'output', 'archive')
+
+# parquet output of every scrape, partitioned by retrieved date and apartment
+PARQUET_DIR = os.path.join(os.path.dirname(__file__), 'output', 'parquet')
+PARQUET_COMPRESSION = 'zstd'
+
+# streaming pipeline, rows are written in batches while a site is still being crawled
+PIPELINE_BATCH_SIZE = 500       # rows per batch
+PIPELINE_FLUSH_SECONDS = 30     # a batch is written at least this often, even if it isn't full
+
+# apartments.com aggregator, see apartments_com/aggregator.py
+OFFICIAL_SOURCE = 'official'    # source of the rows scraped from the buildings' own websites
+AGGREGATOR_SOURCE = 'apartments.com'
+AGGREGATOR_CHUNK = 20   # buildings fetched before their rows are handed to the pipeline
+
+# run.py orchestrator
+SITE_WORKERS = 4    # sites scraped at the same time
+WORKER_BUDGET = 8   # detail requests in flight across all sites
+# stage timings and counters of every run, see metrics.py
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(os.path.dirname(__file__), 'output', 'metrics'))
+METRICS_PREFIX = 'apartment_spider'     # prometheus metric names and the .prom file name
+
+
 # postgresql database
 DB_NAME = 'apartment_history'
 DB_USER = 'niksun'
 DB_PASSWORD = ''
 DB_HOST = 'localhost'
 DB_PORT = '5432'
+DB_POOL_MIN = 1     # connections opened with the pool
+DB_POOL_MAX = 4     # connections shared by all spiders and detail workers
+# 'snapshots' appends every unit on every scrape to availabilities,
+# 'intervals' keeps one row per listing state in listing_intervals (see intervals.py)
+STORAGE_MODEL = os.getenv('STORAGE_MODEL', 'snapshots')
+INSERT_METHOD = os.getenv('INSERT_METHOD', 'copy')   # 'copy' (COPY FROM STDIN) or 'values' (multi-row INSERT)
+INSERT_BATCH_SIZE = 100000  # rows per transaction
+INSERT_PAGE_SIZE = 1000     # rows per INSERT statement with the 'values' method
+
+# schema migrations, applied with python migrate.py
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+MIGRATION_BATCH_SIZE = 50000    # rows copied per transaction when a migration moves data
+PARTITION_MONTHS_AHEAD = 3      # monthly partitions of availabilities created ahead of time
+ANALYSIS_CHUNK_SIZE = 50000     # rows fetched per round trip by the analysis queries
 
 
 # logging settings
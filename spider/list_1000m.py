@@ -1,41 +1,52 @@
-import pandas as pd
-from io import StringIO
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
-
 from settings import M1000_URL
-from config import connection
-from utils import setup_driver, insert_data
+from fetcher import fetch_page
+from extract import parse_section, read_table
+from driver_pool import driver_pool
+from pipeline import Pipeline, ParquetSink, default_sinks
+from normalize import normalize, text, number, date
+from metrics import metrics
 from log import logger
 
 
 # NOTE: 1000M default rent is 12 months, same rent for 24/36 months contract
-# use selenium to fetch the page content
+# fetch the page content, over plain http if the table is server-rendered, o.w. with selenium
 # read table tag content to get listings
 
+TABLE_XPATH = '//*[@id="availability-table"]'
+
+FIELD_RULES = {
+    'Unit': text(remove=['Apt #:']),
+    'Plan': text(remove=['Floor Plan:']),
+    'Bedrooms': text(source='Beds', remove=['Beds:', 'Bed']),
+    'Beds': number(keywords={'Den': 1.5, 'Studio': 0, 'Convertible': 0}),
+    'Baths': number(),
+    'Sq_ft': number(),
+    'Rent': number(),
+    'Availability': date(remove=['Available:'], now=['Now']),
+}
+
+
+@metrics.timed('parse')
+def parse_table(html):
+    """Read the availability table of the listing page."""
+    table = parse_section(html, element_id='availability-table')
+    if table is None:
+        return None
+    df, _ = read_table(table)
+    return df
+
 
 def fetch_table(url=M1000_URL):
-    driver = setup_driver()
     try:
-        driver.get(url)
-        wait = WebDriverWait(driver, 10)
-        table_element = wait.until(EC.visibility_of_element_located((By.ID, 'availability-table')))
-        table = table_element.get_attribute('outerHTML')
-        df = pd.read_html(StringIO(table))[0]
+        df = fetch_page('1000m', url, TABLE_XPATH, parse_table)
         logger.info(f"There are {df.shape[0]} available units at 1000M")
         return df
-    except TimeoutException:
-        logger.error(f"Timeout while waiting for the table element at {url}")
     except Exception as e:
         logger.error(f"Error during data extraction: {e}")
-    finally:
-        driver.quit()
     return None
 
 
-def clean_data(df):
+def clean_data(df, retrieved):
     df = df.drop(columns=['Unnamed: 7'])
     df = df.rename(columns={
         'Apt#': 'Unit',
@@ -48,34 +59,21 @@ def clean_data(df):
     })
 
     df['Apartment'] = '1000M'
-    df['Retrieved'] = pd.Timestamp.now()
-
-    df['Unit'] = df['Unit'].str.replace('Apt #:', '').str.strip()
-    df['Plan'] = df['Plan'].str.replace('Floor Plan:', '').str.strip()
-    df['Bedrooms'] = df['Beds'].str.replace('Beds:', '').str.replace('Bed', '').str.strip()
-    df['Beds'] = df['Bedrooms']
-    df.loc[df['Bedrooms'].str.contains('Studio|Convertible'), 'Beds'] = 0
-    df.loc[df['Bedrooms'].str.contains('Den'), 'Beds'] = 1.5
-    df['Baths'] = df['Baths'].str.replace('Baths:', '').str.replace('Bath', '').str.strip()
-    df['Sq_ft'] = df['Sq_ft'].str.replace('Size:', '').str.replace(',', '').str.replace('sf', '').str.strip()
-    df['Rent'] = df['Rent'].str.replace('Price:', '').str.replace('$', '').str.replace(',', '').str.strip()
-    df['Availability'] = df['Availability'].str.replace('Available:', '').str.strip()
-    df.loc[df['Availability'].str.contains('Now'), 'Availability'] = pd.Timestamp.now().date()
-    df['Availability'] = pd.to_datetime(df['Availability'])
+    df['Retrieved'] = retrieved
+
+    df = normalize(df, FIELD_RULES, now=retrieved)
 
     df = df[['Apartment', 'Plan', 'Unit', 'Bedrooms','Beds', 'Baths', 'Sq_ft', 'Rent', 'Availability', 'Retrieved']]
 
     return df
 
 
-def get_1000m_listings():
-    df = fetch_table()
-    df = clean_data(df)
-    print(df)
-    insert_data(connection, df)
-    return df
+def get_1000m_listings(insert=True, sinks=()):
+    """Scrape 1000M and write its rows to the sinks (and the database if insert), return the row count."""
+    pipeline = Pipeline('1000m', clean_data, default_sinks(insert, sinks))
+    return pipeline.run([fetch_table()])
 
 
 if __name__ == '__main__':
-    df = get_1000m_listings()
-    df.to_csv(f'./output/apts/1000m_{pd.Timestamp.now().date()}.csv', index=False)
+    get_1000m_listings(sinks=[ParquetSink()])
+    driver_pool.log_stats()
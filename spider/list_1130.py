@@ -1,124 +1,140 @@
 import pandas as pd
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException
 
 from settings import ELEVEN30_URL
-from config import connection
-from utils import setup_driver, insert_data
+from fetcher import fetch_page
+from extract import parse_html, xpath, class_xpath, inner_text
+from driver_pool import driver_pool
+from incremental import crawl_changed, rent_from_snapshot
+from pipeline import Pipeline, ParquetSink, default_sinks
+from normalize import normalize, text, number, date
+from metrics import metrics
 from log import logger
 
 # NOTE: designed by RentCafe
-# use selenium to fetch the floor plans with available units
+# fetch the floor plans with available units, over plain http if server-rendered, o.w. with selenium
 # find SEE LEASE INFORMATION button href in each unit, redirect and read html to get 12-month rent
 
-def fetch_listings(url=ELEVEN30_URL):
+FLOOR_PLAN_XPATH = class_xpath('units-list', scope='//')
+RENT_XPATH = '//*[@id="CSFlipCard"]/div/div[1]/div[2]/div[1]/div/span[1]'
+FLOOR_PLANS = xpath(FLOOR_PLAN_XPATH)
+PLAN_TITLE = xpath('.//h3')
+TABLE_BODY = xpath(class_xpath('table-body'))
+UNITS = xpath(class_xpath('unit-item'))
+UNIT_CELLS = xpath(class_xpath('col-2'))
+SPAN = xpath('.//span')
+LINKS = xpath('.//a')
+RENT = xpath(RENT_XPATH)
+
+# the plan name ends with the room counts, e.g. 'A1 (1BR/1BA)' or 'S1 (Studio)'
+BEDROOMS_PATTERN = r'\(([^/()]*)[^()]*\)\s*$'
+BATHS_PATTERN = r'\((?:[^/()]*/)?([^()]*)\)\s*$'
+
+FIELD_RULES = {
+    'Bedrooms': text(source='Plan', pattern=BEDROOMS_PATTERN),
+    'Beds': number(source='Plan', pattern=BEDROOMS_PATTERN, keywords={'Studio': 0}),
+    'Baths': number(source='Plan', pattern=BATHS_PATTERN, keywords={'Studio': 1}),
+    'Sq_ft': number(),
+    'Rent': number(),
+    'Availability': date(now=['Now']),
+}
+
+
+@metrics.timed('parse')
+def parse_listings(html, url=ELEVEN30_URL):
     """
-    Fetch all floor plans within the page, then find all listings from each floor plan div.
+    Find all floor plans within the page, then all listings from each floor plan div.
     """
-    driver = setup_driver()
-    try:
-        driver.get(url)
-        wait = WebDriverWait(driver, 10)
-        floor_plans = wait.until(EC.visibility_of_all_elements_located((By.CLASS_NAME, 'units-list')))
-        logger.info(f"There are {len(floor_plans)} floor plans at 1130")
-
-        data = []
-        for fp in floor_plans:
-            try:
-                # floor plan in section title, including bed/bath count
-                plan = fp.find_element(By.TAG_NAME, 'h3').text
-
-                # available units
-                fp_listings = fp.find_element(By.CLASS_NAME, 'table-body')
-                units = fp_listings.find_elements(By.CLASS_NAME, 'unit-item')
-                logger.info(f"There are {len(units)} units available for {plan}")
-
-                for unit in units:
-                    try:
-                        # basic unit info
-                        unit_infos = unit.find_elements(By.CLASS_NAME, 'col-2')
-                        unit_num = unit_infos[0].find_element(By.TAG_NAME, 'span').text
-                        sq_ft = unit_infos[1].text
-                        rent_range = unit_infos[2].text
-                        availability = unit_infos[3].text
-                        unit_info_list = [plan, unit_num, sq_ft, rent_range, availability]
-                        # button href
-                        link = unit.find_elements(By.TAG_NAME, 'a')[-1].get_attribute('href')
-
-                        unit_info_list.append(link)
-                        logger.info(f"Unit {unit_num}, {sq_ft}, {rent_range}, {availability}, {link}")
-                        data.append(unit_info_list)
-
-                    except Exception as unit_exception:
-                        logger.error(f"Error processing unit: {unit_exception}")
-                        continue
-
-            except Exception as plan_exception:
-                logger.error(f"Error processing floor plan: {plan_exception}")
-                continue
-
-        df = pd.DataFrame(data, columns=['Plan', 'Unit', 'Sq_ft', 'Rent_range', 'Availability', 'href'])
-
-        return df
+    tree = parse_html(html, base_url=url)
+    floor_plans = FLOOR_PLANS(tree)
+    logger.info(f"There are {len(floor_plans)} floor plans at 1130")
+
+    data = []
+    for fp in floor_plans:
+        try:
+            # floor plan in section title, including bed/bath count
+            plan = inner_text(PLAN_TITLE(fp)[0])
+
+            # available units
+            fp_listings = TABLE_BODY(fp)[0]
+            units = UNITS(fp_listings)
+            logger.info(f"There are {len(units)} units available for {plan}")
+
+            for unit in units:
+                try:
+                    # basic unit info
+                    unit_infos = UNIT_CELLS(unit)
+                    unit_num = inner_text(SPAN(unit_infos[0])[0])
+                    sq_ft = inner_text(unit_infos[1])
+                    rent_range = inner_text(unit_infos[2])
+                    availability = inner_text(unit_infos[3])
+                    unit_info_list = [plan, unit_num, sq_ft, rent_range, availability]
+                    # button href
+                    link = LINKS(unit)[-1].get('href')
+
+                    unit_info_list.append(link)
+                    logger.info(f"Unit {unit_num}, {sq_ft}, {rent_range}, {availability}, {link}")
+                    data.append(unit_info_list)
+
+                except Exception as unit_exception:
+                    logger.error(f"Error processing unit: {unit_exception}")
+                    continue
+
+        except Exception as plan_exception:
+            logger.error(f"Error processing floor plan: {plan_exception}")
+            continue
+
+    df = pd.DataFrame(data, columns=['Plan', 'Unit', 'Sq_ft', 'Rent_range', 'Availability', 'href'])
+
+    return df
+
 
+def fetch_listings(url=ELEVEN30_URL):
+    try:
+        return fetch_page('1130', url, FLOOR_PLAN_XPATH, lambda html: parse_listings(html, url))
     except Exception as e:
         logger.error(f"Error fetching listings: {e}")
 
-    finally:
-        driver.quit()
 
+def fetch_unit_rent(link):
+    """Read the 12-month rent from the lease information page of a unit."""
+    return fetch_page('1130_lease', link, RENT_XPATH, parse_rent)
 
-def get_unit_details(df):
-    unit_links = df['href'].tolist()
 
-    twelve_month_rent = []
-    for link in unit_links:
-        driver = setup_driver()
-        driver.get(link)
-        try:
-            rent_element = driver.find_element(By.XPATH, '//*[@id="CSFlipCard"]/div/div[1]/div[2]/div[1]/div/span[1]')
-            rent = rent_element.text.replace('$', '').replace(',', '')
-        except NoSuchElementException:
-            rent = None
+@metrics.timed('parse')
+def parse_rent(html):
+    rent_elements = RENT(parse_html(html))
+    if not rent_elements:
+        return None
+    return inner_text(rent_elements[0]).replace('$', '').replace(',', '')
 
-        twelve_month_rent.append(rent)
-        driver.quit()
+
+def get_unit_details(df):
+    twelve_month_rent = crawl_changed(df, 'Eleven 30', fetch_unit_rent,
+                                      from_snapshot=rent_from_snapshot, archive_site='1130_lease')
 
     df['Rent'] = twelve_month_rent
 
     return df
 
 
-def clean_data(df):
+def clean_data(df, retrieved):
     df['Apartment'] = 'Eleven 30'
-    df['Retrieved'] = pd.Timestamp.now()
+    df['Retrieved'] = retrieved
 
-    df['rooms'] = df['Plan'].apply(lambda x: x.split(' ')[-1])
-    df['rooms'] = df['rooms'].str.replace('(', '').str.replace(')', '')
-    df['Bedrooms'] = df['rooms'].apply(lambda x: x.split('/')[0])
-    df['Beds'] = df['Bedrooms'].str.replace('BR', '').str.strip()
-    df['Beds'] = df['Beds'].apply(lambda x: 0 if x == 'Studio' else x)
-    df['Baths'] = df['rooms'].apply(lambda x: x.split('/')[-1])
-    df['Baths'] = df['Baths'].str.replace('BA', '').str.strip()
-    df['Baths'] = df['Baths'].apply(lambda x: 1 if x == 'Studio' else x)
-    df.loc[df['Availability'].str.contains('Now'), 'Availability'] = pd.Timestamp.now().date()
-    df['Availability'] = pd.to_datetime(df['Availability'])
+    df = normalize(df, FIELD_RULES, now=retrieved)
 
-    df = df[['Apartment', 'Plan', 'Unit', 'Bedrooms','Beds', 'Baths', 'Sq_ft', 'Rent', 'Availability', 'Retrieved']]
+    df = df[['Apartment', 'Plan', 'Unit', 'Bedrooms','Beds', 'Baths', 'Sq_ft', 'Rent', 'Availability', 'Retrieved', 'Fingerprint']]
 
     return df
 
 
-def get_1130_listings():
+def get_1130_listings(insert=True, sinks=()):
+    """Scrape Eleven 30 and write its rows to the sinks (and the database if insert), return the row count."""
+    pipeline = Pipeline('1130', clean_data, default_sinks(insert, sinks))
     df = fetch_listings()
-    df = get_unit_details(df)
-    df = clean_data(df)
-    insert_data(connection, df)
-    return df
+    return pipeline.run([get_unit_details(df)] if df is not None else [])
 
 
 if __name__ == '__main__':
-    df = get_1130_listings()
-    df.to_csv(f'./output/apts/1130_{pd.Timestamp.now().date()}.csv', index=False)
+    get_1130_listings(sinks=[ParquetSink()])
+    driver_pool.log_stats()
@@ -1,51 +1,60 @@
-import pandas as pd
-from io import StringIO
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-
 from settings import ELEVEN40_URL
-from config import connection
-from utils import setup_driver, insert_data
-from log import logger
+from fetcher import fetch_page
+from extract import parse_html, xpath, class_xpath, inner_text, read_table
+from driver_pool import driver_pool
+from incremental import crawl_changed
+from lease import fetch_lease_details, log_lease_stats
+from pipeline import Pipeline, ParquetSink, default_sinks
+from normalize import normalize, text, number, date
+from metrics import metrics
 
+FLOOR_PLAN_XPATH = class_xpath('floorplan-section', scope='//')
+FLOOR_PLANS = xpath(FLOOR_PLAN_XPATH)
+PLAN_INFO = xpath(class_xpath('col-lg-8'))
 
-def get_floor_plans(url=ELEVEN40_URL):
-    """Scrape floor plan data from the specified URL."""
-    driver = setup_driver()
-    driver.get(url)
+FIELD_RULES = {
+    'Unit': text(remove=['Apartment: #']),
+    'Sq_ft': number(),
+    'Bedrooms': text(remove=['Bedroom', 's']),
+    'Beds': number(source='Bedrooms', keywords={'Studio': 0}),
+    'Baths': number(),
+    'Rent': number(),
+    'Availability': date(remove=['Available:']),
+}
 
-    try:
-        floor_plans = driver.find_elements(By.CLASS_NAME, 'floorplan-section')
-        print(f'Total floor plans: {len(floor_plans)}')
 
-        df = pd.DataFrame()
-        for fp in floor_plans:
-            df_section = extract_floor_plan_info(fp)
-            df = pd.concat([df, df_section], ignore_index=True)
-            print('-------------------')
+def iter_floor_plans(url=ELEVEN40_URL):
+    """Yield the unit table of every floor plan on the page."""
+    # a list, the parsed tables are stored for the next run if the page doesn't change
+    yield from fetch_page('1140', url, FLOOR_PLAN_XPATH, lambda html: list(parse_floor_plans(html, url)))
 
-    finally:
-        driver.quit()
 
-    return df
+@metrics.timed('parse')
+def parse_floor_plans(html, url=ELEVEN40_URL):
+    """Yield the unit table of every floor plan in the html of the floor plans page."""
+    tree = parse_html(html, base_url=url)
+
+    floor_plans = FLOOR_PLANS(tree)
+    print(f'Total floor plans: {len(floor_plans)}')
+
+    for fp in floor_plans:
+        yield extract_floor_plan_info(fp)
+        print('-------------------')
 
 
 def extract_floor_plan_info(fp):
     """Extract information of a single floor plan."""
-    fp_info = fp.find_element(By.CLASS_NAME, 'col-lg-8')
-    plan = fp_info.text.split('\n')[0]
-    rooms = fp_info.text.split('\n')[-1]
+    fp_info = inner_text(PLAN_INFO(fp)[0])
+    plan = fp_info.split('\n')[0]
+    rooms = fp_info.split('\n')[-1]
     print(f'Floor Plan: {plan}, Rooms: {rooms}')
 
     bedrooms, bathrooms = rooms.split('|')
     
-    table = fp.find_element(By.TAG_NAME, 'table')
-    hrefs = [a.get_attribute('href') for a in table.find_elements(By.TAG_NAME, 'a')]
+    df_section, links = read_table(fp)
+    hrefs = [href for row_links in links for href in row_links]
     print(f'number of select links: {len(hrefs)}')
 
-    df_section = pd.read_html(StringIO(table.get_attribute('outerHTML')))[0]
     df_section['Plan'] = plan
     df_section['Bedrooms'] = bedrooms.strip()
     df_section['Baths'] = bathrooms.strip()
@@ -55,38 +64,11 @@ def extract_floor_plan_info(fp):
     return df_section
 
 
-def fetch_unit_details(link):
-    """Fetch details of a unit from its link."""
-    driver = setup_driver()
-    try:
-        driver.get(link)
-        lease_info = driver.find_element(By.ID, 'divTermInfo')
-
-        date_input = lease_info.find_element(By.ID, 'DateDiv').find_element(By.TAG_NAME, 'input')
-        availability = date_input.get_attribute('value')
-
-        rent_info = lease_info.find_element(By.ID, 'divPricingInfo').text
-        rent = rent_info.split('\n')[1] if rent_info else None
-
-        return availability, rent
-
-    except NoSuchElementException as e:
-        logger.error(f"Element not found: {e}")
-        return None, None
-
-    except Exception as e:
-        logger.error(f"Error fetching unit details: {e}")
-        return None, None
-
-    finally:
-        driver.quit()
-
-
 def get_all_unit_details(df):
     """Fetch details for all units in the DataFrame."""
     availability_dates, twelve_month_rent = [], []
-    for link in df['href'].tolist():
-        availability, rent = fetch_unit_details(link)
+    for details in crawl_changed(df, 'Eleven 40', fetch_lease_details):
+        availability, rent = details or (None, None)
         availability_dates.append(availability)
         twelve_month_rent.append(rent)
     
@@ -95,7 +77,7 @@ def get_all_unit_details(df):
     return df
 
 
-def clean_data(df):
+def clean_data(df, retrieved):
     """Clean and prepare the DataFrame for database insertion."""
     df.drop(columns=['Action', 'href', 'Rent'], inplace=True)
     df.rename(columns={
@@ -105,33 +87,22 @@ def clean_data(df):
     }, inplace=True)
 
     df['Apartment'] = 'Eleven 40'
-    df['Retrieved'] = pd.Timestamp.now()
-
-    df['Unit'] = df['Unit'].str.replace('Apartment: #', '').str.strip()
-    df['Sq_ft'] = df['Sq_ft'].str.replace('Sq. Ft.:', '').str.replace(',', '').str.strip()
-    df['Bedrooms'] = df['Bedrooms'].str.replace('Bedroom', '').str.replace('s', '').str.strip()
-    df['Beds'] = df['Bedrooms']
-    df.loc[df['Bedrooms'].str.contains('Studio'), 'Beds'] = 0
-    df['Baths'] = df['Baths'].str.replace('Bathroom', '').str.replace('s', '').str.strip()
-    df['Rent'] = df['Rent'].str.replace('$', '').str.replace(',', '').str.strip()
-    df['Availability'] = df['Availability'].str.replace('Available:', '').str.strip()
-    df['Availability'] = pd.to_datetime(df['Availability'])
+    df['Retrieved'] = retrieved
 
+    df = normalize(df, FIELD_RULES, now=retrieved)
 
-    df = df[['Apartment', 'Plan', 'Unit', 'Bedrooms', 'Beds', 'Baths', 'Sq_ft', 'Rent', 'Availability', 'Retrieved']]
+    df = df[['Apartment', 'Plan', 'Unit', 'Bedrooms', 'Beds', 'Baths', 'Sq_ft', 'Rent', 'Availability', 'Retrieved', 'Fingerprint']]
 
     return df
 
 
-def get_1140_listings():
-    """Main function to scrape and process listings."""
-    df = get_floor_plans()
-    df = get_all_unit_details(df)
-    df = clean_data(df)
-    insert_data(connection, df)
-    return df
+def get_1140_listings(insert=True, sinks=()):
+    """Scrape Eleven 40 and write its rows to the sinks (and the database if insert), return the row count."""
+    pipeline = Pipeline('1140', clean_data, default_sinks(insert, sinks))
+    return pipeline.run(get_all_unit_details(table) for table in iter_floor_plans())
 
 
 if __name__ == '__main__':
-    df = get_1140_listings()
-    df.to_csv(f'./output/apts/1140_{pd.Timestamp.now().date()}.csv', index=False)
+    get_1140_listings(sinks=[ParquetSink()])
+    driver_pool.log_stats()
+    log_lease_stats()
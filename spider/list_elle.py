@@ -1,13 +1,14 @@
 import pandas as pd
-from io import StringIO
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
 from settings import ELLE_URL
-from config import connection
-from utils import setup_driver, insert_data
+from fetcher import fetch_page
+from extract import parse_section, xpath, class_xpath, inner_text, read_table
+from driver_pool import driver_pool
+from incremental import crawl_changed
+from lease import fetch_lease_details, log_lease_stats
+from pipeline import Pipeline, ParquetSink, default_sinks
+from normalize import normalize, text, number, date
+from metrics import metrics
 from log import logger
 
 # NOTE:
@@ -16,116 +17,103 @@ from log import logger
 # use available button to get to unit listing page
 # use select button to get to leasing info page
 
+FLOOR_PLANS_XPATH = '//*[@id="floorplans-container"]'
+SECTION_XPATH = class_xpath('floorplan-section', scope='//')
+FLOOR_PLAN_CARDS = xpath(class_xpath('fp-container'))
+CARD_HEADER = xpath(class_xpath('card-header'))
+CARD_BODY = xpath(class_xpath('card-body'))
+LINKS = xpath('.//a')
+TITLE = xpath('.//h2')
+SPANS = xpath('.//span')
+TABLE_DIV = xpath(class_xpath('table-responsive'))
+
+FIELD_RULES = {
+    'Unit': text(remove=['Apartment: #']),
+    'Sq_ft': number(),
+    'Bedrooms': text(remove=['Bedroom', 's']),
+    'Beds': number(source='Bedrooms', keywords={'Studio': 0}),
+    'Baths': number(),
+    'Rent': number(),
+    'Availability': date(remove=['Available:']),
+}
+
+
 def get_floor_plans(url=ELLE_URL):
     # find all listed floor plans
-    driver = setup_driver()
-    driver.get(url)
+    return fetch_page('elle', url, FLOOR_PLANS_XPATH, lambda html: parse_floor_plan_cards(html, url))
 
+
+@metrics.timed('parse')
+def parse_floor_plan_cards(html, url):
+    """Read the name, rooms and link of every floor plan card."""
     # 1. find section of all floor plans
-    floor_plan_container = driver.find_element(By.ID, 'floorplans-container')
-    floor_plans = floor_plan_container.find_elements(By.CLASS_NAME, 'fp-container')
+    floor_plan_container = parse_section(html, element_id='floorplans-container', base_url=url)
+    if floor_plan_container is None:
+        return None
+    floor_plans = FLOOR_PLAN_CARDS(floor_plan_container)
     logger.info(f'There are {len(floor_plans)} floor plans for Elle.')
 
     data = []
     for fp in floor_plans:
         # find floor plan info by class name
-        fp_info = fp.find_element(By.CLASS_NAME, 'card-header')
-        fp_info_list = fp_info.text.split('\n')
+        fp_info = CARD_HEADER(fp)[0]
+        fp_info_list = inner_text(fp_info).split('\n')
         # print(fp_info_list)
-        fp_link = fp.find_element(By.CLASS_NAME, 'card-body')
-        a_tags = fp_link.find_elements(By.TAG_NAME, 'a')[-2].get_attribute('href')
+        fp_link = CARD_BODY(fp)[0]
+        a_tags = LINKS(fp_link)[-2].get('href')
         # print(a_tags)
         fp_info_list.append(a_tags)
         data.append(fp_info_list)
 
     df = pd.DataFrame(data, columns=['Plan', 'Bedrooms', 'Baths', 'Sq_ft', 'link'])
 
-    driver.quit()
-
     return df
 
 
-def get_unit_listing(df):
+def iter_unit_listings(df):
+    """Yield the unit table of every floor plan page as soon as it is parsed."""
     fp_links = df['link'].tolist()
     fp_links = [link for link in fp_links if 'https://www.theellechicago.com/floorplans/' in link]
     print(f'Number of floor plan links: {len(fp_links)}')
 
-    listing_df = pd.DataFrame()
     for link in fp_links:
-        driver = setup_driver()
-        driver.get(link)
-
-        section = driver.find_element(By.CLASS_NAME, 'floorplan-section')
-
-        # read floor plan details
-        h2 = section.find_element(By.TAG_NAME, 'h2')
-        plan = h2.text
-        print(plan)
-        spans = section.find_elements(By.TAG_NAME, 'span')[:2]
-        bedrooms = spans[0].text
-        baths = spans[1].text
-        print(f'bedrooms: {bedrooms}, baths: {baths}')
-
-        # read listing table
-        table_div = section.find_element(By.CLASS_NAME, 'table-responsive')
-
-        unit_href = []
-        rows = table_div.find_elements(By.TAG_NAME, 'tr')
-        for row in rows[1:]:
-            cells = row.find_elements(By.TAG_NAME, 'td')
-            if cells:
-                last_cell = cells[-1]
-                a_tag = last_cell.find_element(By.TAG_NAME, 'a')
-                link = a_tag.get_attribute('href')
-                print(f'Link in last column: {link}')
-                unit_href.append(link)
+        yield fetch_page('elle_floorplan', link, SECTION_XPATH, lambda html: parse_floor_plan(html, link))
 
-        table_html = table_div.get_attribute('outerHTML')
-        table = pd.read_html(StringIO(table_html))[0]
-        table['Plan'] = plan
-        table['Bedrooms'] = bedrooms
-        table['Baths'] = baths
-        table['href'] = unit_href
 
-        listing_df = pd.concat([listing_df, table], ignore_index=True)
+@metrics.timed('parse')
+def parse_floor_plan(html, link):
+    """Read the unit table of a floor plan page, with the select link of every unit in href."""
+    section = parse_section(html, class_name='floorplan-section', base_url=link)
+    if section is None:
+        return None
 
-        driver.quit()
+    # read floor plan details
+    h2 = TITLE(section)[0]
+    plan = inner_text(h2)
+    print(plan)
+    spans = SPANS(section)[:2]
+    bedrooms = inner_text(spans[0])
+    baths = inner_text(spans[1])
+    print(f'bedrooms: {bedrooms}, baths: {baths}')
 
-    return listing_df
+    # read listing table, with the select link in the last column of each unit
+    table, links = read_table(TABLE_DIV(section)[0], link_cell=-1)
+    unit_href = [hrefs[0] if hrefs else None for hrefs in links]
+    print(f'Links in last column: {unit_href}')
 
+    table['Plan'] = plan
+    table['Bedrooms'] = bedrooms
+    table['Baths'] = baths
+    table['href'] = unit_href
 
-def fetch_unit_details(link):
-    """Fetch details of a unit from its link."""
-    driver = setup_driver()
-    try:
-        driver.get(link)
-        lease_info = driver.find_element(By.ID, 'divTermInfo')
-
-        date_input = lease_info.find_element(By.ID, 'DateDiv').find_element(By.TAG_NAME, 'input')
-        availability = date_input.get_attribute('value')
-
-        rent_info = lease_info.find_element(By.ID, 'divPricingInfo').text
-        rent = rent_info.split('\n')[1] if rent_info else None
-
-        return availability, rent
-
-    except NoSuchElementException as e:
-        logger.error(f"Element not found: {e}")
-        return None, None
-
-    except Exception as e:
-        logger.error(f"Error fetching unit details: {e}")
-        return None, None
-
-    finally:
-        driver.quit()
+    return table
 
 
 def get_all_unit_details(df):
     """Fetch details for all units in the DataFrame."""
     availability_dates, twelve_month_rent = [], []
-    for link in df['href'].tolist():
-        availability, rent = fetch_unit_details(link)
+    for details in crawl_changed(df, 'ELLE', fetch_lease_details):
+        availability, rent = details or (None, None)
         availability_dates.append(availability)
         twelve_month_rent.append(rent)
     
@@ -134,7 +122,7 @@ def get_all_unit_details(df):
     return df
 
 
-def clean_data(df):
+def clean_data(df, retrieved):
     df.drop(columns=['Action', 'href', 'Rent', 'Date Available'], inplace=True)
     df.rename(columns={
         'Apartment': 'Unit',
@@ -143,31 +131,23 @@ def clean_data(df):
     }, inplace=True)
 
     df['Apartment'] = 'ELLE'
-    df['Retrieved'] = pd.Timestamp.now()
+    df['Retrieved'] = retrieved
 
-    df['Unit'] = df['Unit'].str.replace('Apartment: #', '').str.strip()
-    df['Sq_ft'] = df['Sq_ft'].str.replace('Sq. Ft.:', '').str.replace(',', '').str.strip()
-    df['Bedrooms'] = df['Bedrooms'].str.replace('Bedroom', '').str.replace('s', '').str.strip()
-    df['Beds'] = df['Bedrooms'].apply(lambda x: 0 if x == 'Studio' else x)
-    df['Baths'] = df['Baths'].str.replace('Bathroom', '').str.replace('s', '').str.strip()
-    df['Rent'] = df['Rent'].str.replace('$', '').str.replace(',', '').str.strip()
-    df['Availability'] = df['Availability'].str.replace('Available:', '').str.strip()
-    df['Availability'] = pd.to_datetime(df['Availability'])
+    df = normalize(df, FIELD_RULES, now=retrieved)
 
-    df = df[['Apartment', 'Plan', 'Unit', 'Bedrooms','Beds', 'Baths', 'Sq_ft', 'Rent', 'Availability', 'Retrieved']]
+    df = df[['Apartment', 'Plan', 'Unit', 'Bedrooms','Beds', 'Baths', 'Sq_ft', 'Rent', 'Availability', 'Retrieved', 'Fingerprint']]
 
     return df
 
 
-def get_elle_listings():
-    df = get_floor_plans()
-    df = get_unit_listing(df)
-    df = get_all_unit_details(df)
-    df = clean_data(df)
-    insert_data(connection, df)
-    return df
+def get_elle_listings(insert=True, sinks=()):
+    """Scrape ELLE and write its rows to the sinks (and the database if insert), return the row count."""
+    pipeline = Pipeline('elle', clean_data, default_sinks(insert, sinks))
+    tables = iter_unit_listings(get_floor_plans())
+    return pipeline.run(get_all_unit_details(table) for table in tables)
 
 
 if __name__ == '__main__':
-    df = get_elle_listings()
-    df.to_csv(f'./output/apts/elle_{pd.Timestamp.now().date()}.csv', index=False)
\ No newline at end of file
+    get_elle_listings(sinks=[ParquetSink()])
+    driver_pool.log_stats()
+    log_lease_stats()
@@ -1,76 +1,59 @@
-import pandas as pd
-from io import StringIO
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from bs4 import BeautifulSoup
-
 from settings import LINEA_URL
-from config import connection
-from utils import setup_driver, insert_data
+from fetcher import fetch_page
+from extract import parse_section, read_table
+from driver_pool import driver_pool
+from incremental import crawl_changed
+from lease import fetch_lease_details, log_lease_stats
+from pipeline import Pipeline, ParquetSink, default_sinks
+from normalize import normalize, text, number, date
+from metrics import metrics
 from log import logger
 
 # NOTE: designed by Willow Bridge, same layout as 1000M
-# use selenium to fetch the page content
+# fetch the page content, over plain http if the table is server-rendered, o.w. with selenium
 # read table tag content to get listings
 # find LEASE button href in each unit, redirect and read html to get 12-month rent
 
+TABLE_XPATH = '//*[@id="availability-table"]'
+
+FIELD_RULES = {
+    'Unit': text(remove=['Apt #:']),
+    'Plan': text(remove=['Floor Plan:']),
+    'Bedrooms': text(source='Beds', remove=['Beds:', 'Bed']),
+    'Beds': number(keywords={'Studio': 0, 'Convertible': 0}),
+    'Baths': number(),
+    'Sq_ft': number(),
+    'Rent': number(),
+    'Availability': date(remove=['Available:']),
+}
+
+
+@metrics.timed('parse')
+def parse_table(html, url=LINEA_URL):
+    """Read the availability table of the listing page, with the LEASE link of every unit in href."""
+    table = parse_section(html, element_id='availability-table', base_url=url)
+    if table is None:
+        return None
+    # the LEASE button is the last link in the last cell of each unit
+    df, links = read_table(table, link_cell=-1)
+    df['href'] = [hrefs[-1] if hrefs else None for hrefs in links]
+    return df
+
+
 def fetch_table(url=LINEA_URL):
-    driver = setup_driver()
     try:
-        driver.get(url)
-        wait = WebDriverWait(driver, 10)
-        table_element = wait.until(EC.visibility_of_element_located((By.ID, 'availability-table')))
-        table_html = table_element.get_attribute('outerHTML')
-        df = pd.read_html(StringIO(table_html))[0]
-
-        # find the LEASE button href in each unit
-        soup = BeautifulSoup(table_html, 'html.parser')
-        rows = soup.find_all('tr')
-        hrefs = [row.find_all('td')[-1].find_all('a')[-1]['href'] 
-                 if row.find_all('td')[-1].find_all('a') else None for row in rows[1:]]
-        df['href'] = hrefs
-
+        df = fetch_page('linea', url, TABLE_XPATH, lambda html: parse_table(html, url))
         logger.info(f"There are {df.shape[0]} available units at LINEA")
         return df
-    except TimeoutException:
-        logger.error(f"Timeout while waiting for the table element at {url}")
     except Exception as e:
         logger.error(f"Error fetching the page: {e}")
-    finally:
-        driver.quit()
     return None
 
 
-def fetch_unit_details(link):
-    """Fetch details of a unit from its link."""
-    driver = setup_driver()
-    try:
-        driver.get(link)
-        lease_info = driver.find_element(By.ID, 'divTermInfo')
-
-        date_input = lease_info.find_element(By.ID, 'DateDiv').find_element(By.TAG_NAME, 'input')
-        availability = date_input.get_attribute('value')
-
-        rent_info = lease_info.find_element(By.ID, 'divPricingInfo').text
-        rent = rent_info.split('\n')[1] if rent_info else None
-
-        return availability, rent
-    except NoSuchElementException as e:
-        logger.error(f"Element not found: {e}")
-        return None, None
-    except Exception as e:
-        logger.error(f"Error fetching unit details: {e}")
-        return None, None
-    finally:
-        driver.quit()
-
-
 def get_all_unit_details(df):
     availability_dates, twelve_month_rent = [], []
-    for link in df['href'].tolist():
-        availability, rent = fetch_unit_details(link)
+    for details in crawl_changed(df, 'LINEA', fetch_lease_details):
+        availability, rent = details or (None, None)
         availability_dates.append(availability)
         twelve_month_rent.append(rent)
     
@@ -79,7 +62,7 @@ def get_all_unit_details(df):
     return df
 
 
-def clean_data(df):
+def clean_data(df, retrieved):
     df = df.drop(columns=['Unnamed: 7', 'Starting at', 'href'])
     df = df.rename(columns={
         'Apt#': 'Unit',
@@ -91,32 +74,23 @@ def clean_data(df):
     })
 
     df['Apartment'] = 'LINEA'
-    df['Retrieved'] = pd.Timestamp.now()
+    df['Retrieved'] = retrieved
 
-    df['Unit'] = df['Unit'].str.replace('Apt #:', '').str.strip()
-    df['Plan'] = df['Plan'].str.replace('Floor Plan:', '').str.strip()
-    df['Bedrooms'] = df['Beds'].str.replace('Beds:', '').str.replace('Bed', '').str.strip()
-    df['Beds'] = df['Bedrooms']
-    df.loc[df['Bedrooms'].str.contains('Studio|Convertible'), 'Beds'] = 0
-    df['Baths'] = df['Baths'].str.replace('Baths:', '').str.replace('Bath', '').str.strip()
-    df['Sq_ft'] = df['Sq_ft'].str.replace('Size:', '').str.replace(',', '').str.replace('sf', '').str.strip()
-    df['Rent'] = df['Rent'].str.replace('Price:', '').str.replace('$', '').str.replace(',', '').str.strip()
-    df['Availability'] = df['Availability'].astype(str).str.replace('Available:', '').str.strip() # why says df object does not have str
-    df['Availability'] = pd.to_datetime(df['Availability'])
+    df = normalize(df, FIELD_RULES, now=retrieved)
 
-    df = df[['Apartment', 'Plan', 'Unit', 'Bedrooms','Beds', 'Baths', 'Sq_ft', 'Rent', 'Availability', 'Retrieved']]
+    df = df[['Apartment', 'Plan', 'Unit', 'Bedrooms','Beds', 'Baths', 'Sq_ft', 'Rent', 'Availability', 'Retrieved', 'Fingerprint']]
 
     return df
 
 
-def get_linea_listings():
+def get_linea_listings(insert=True, sinks=()):
+    """Scrape LINEA and write its rows to the sinks (and the database if insert), return the row count."""
+    pipeline = Pipeline('linea', clean_data, default_sinks(insert, sinks))
     df = fetch_table()
-    df = get_all_unit_details(df)
-    df = clean_data(df)
-    insert_data(connection, df)
-    return df
+    return pipeline.run([get_all_unit_details(df)] if df is not None else [])
 
 
 if __name__ == '__main__':
-    df = get_linea_listings()
-    df.to_csv(f'./output/apts/linea_{pd.Timestamp.now().date()}.csv', index=False)
+    get_linea_listings(sinks=[ParquetSink()])
+    driver_pool.log_stats()
+    log_lease_stats()
@@ -1,29 +1,52 @@
 import requests
 import pandas as pd
-from bs4 import BeautifulSoup
 
 from settings import NEMA_URL
-from config import connection
-from utils import insert_data
+from fetcher import get_session
+from http_cache import http_cache, CachedPage
+from archive import archive
+from extract import parse_html, xpath, class_xpath, joined_text
+from pipeline import Pipeline, ParquetSink, default_sinks
+from normalize import normalize, text, number, date
+from metrics import metrics
 from log import logger
 
 
 # NOTE:  NEMA Chicago default rent is 12 months
-# fetch and parse the page
+# fetch and parse the page, an unchanged page (304) reuses the listings parsed last time
+
+FIELD_RULES = {
+    'Unit': text(remove=['#']),
+    'Bedrooms': text(remove=['Bed', 's']),
+    'Beds': number(source='Bedrooms', keywords={'Studio': 0}),
+    'Baths': number(),
+    'Sq_ft': number(),
+    'Rent': number(),
+    'Availability': date(now=['IMMEDIATE']),
+}
+
+LISTINGS = xpath(class_xpath('availabilities-list__item', scope='//', tag='div'))
+UNIT = xpath(class_xpath('cell--unit', tag='div'))
+ROOMS = xpath(class_xpath('cell--bet', tag='div'))
+SQFT = xpath(class_xpath('cell--size', tag='div'))
+RENT = xpath(class_xpath('cell--minRent', tag='div'))
+AVAILABILITY = xpath(class_xpath('cell--viewAvailability', tag='div'))
+
 
 def fetch_page(url):
+    if archive.replaying:
+        return CachedPage(url, archive.lookup('nema', url), None, False)
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        html = response.text
-        return html
+        page = http_cache.get(get_session(), url, site='nema')
+        archive.record('nema', url, page.text)
+        return page
     except requests.exceptions.RequestException as e:
         logger.error(f'Error fetching page: {e}')
 
 
+@metrics.timed('parse')
 def parse_page(html):
-    soup = BeautifulSoup(html, 'lxml')
-    listings = soup.find_all('div', class_='availabilities-list__item')
+    listings = LISTINGS(parse_html(html))
     logger.info(f'There are {len(listings)} available units at NEMA Chicago')
 
     return listings
@@ -31,50 +54,51 @@ def parse_page(html):
 
 def extract_unit_data(listing):
     try:
-        unit = listing.find('div', class_='cell--unit').get_text(strip=True)
+        unit = joined_text(UNIT(listing)[0])
         return unit
-    except AttributeError:
+    except IndexError:
         logger.error("Error extracting unit data")
         return None
 
 
 def extract_rooms_data(listing):
     try:
-        rooms = listing.find('div', class_='cell--bet').get_text(strip=True)
+        rooms = joined_text(ROOMS(listing)[0])
         bedrooms, baths = rooms.split('/')
         return bedrooms, baths
-    except AttributeError:
+    except IndexError:
         logger.error("Error extracting rooms data")
         return None, None
 
 
 def extract_sqft_data(listing):
     try:
-        sqft = listing.find('div', class_='cell--size').get_text(strip=True)
+        sqft = joined_text(SQFT(listing)[0])
         return sqft
-    except AttributeError:
+    except IndexError:
         logger.error("Error extracting sqft data")
         return None
 
 
 def extract_rent_data(listing):
     try:
-        rent = listing.find('div', class_='cell--minRent').get_text(strip=True)
+        rent = joined_text(RENT(listing)[0])
         return rent
-    except AttributeError:
+    except IndexError:
         logger.error("Error extracting rent data")
         return None
 
 
 def extract_availability_data(listing):
     try:
-        available_date = listing.find('div', class_='cell--viewAvailability').get_text(strip=True)
+        available_date = joined_text(AVAILABILITY(listing)[0])
         return available_date
-    except AttributeError:
+    except IndexError:
         logger.error("Error extracting availability data")
         return None
 
 
+@metrics.timed('parse')
 def extract_data(listings):
     data = []
     for ls in listings:
@@ -94,42 +118,31 @@ def extract_data(listings):
             'Sq_ft': sqft,
             'Rent': rent,
             'Availability': available_date,
-            'Retrieved': pd.Timestamp.now()
+            'Retrieved': archive.now()
         })
 
     df = pd.DataFrame(data)
 
     return df
 
-def clean_data(df):
+def clean_data(df, retrieved):
     df['Apartment'] = 'NEMA Chicago'
-    df['Retrieved'] = pd.Timestamp.now()
-
-    df['Unit'] = df['Unit'].str.replace('#', '').str.strip()
-    df['Bedrooms'] = df['Bedrooms'].str.replace('Bed', '').str.replace('s', '')
-    df['Beds'] = df['Bedrooms']
-    df.loc[df['Bedrooms'].str.contains('Studio'), 'Beds'] = 0
-    df['Baths'] = df['Baths'].str.replace('Bath', '').str.replace('s', '').str.strip()
-    df['Sq_ft'] = df['Sq_ft'].str.replace('SQ.Ft', '').str.replace(',', '')
-    df['Rent'] = df['Rent'].str.replace('$', '').str.replace('/mo', '').str.replace(',', '')
-    df.loc[df['Availability'].str.contains('IMMEDIATE'), 'Availability'] = pd.Timestamp.now().date()
-    df['Availability'] = pd.to_datetime(df['Availability'])
+    df['Retrieved'] = retrieved
+
+    df = normalize(df, FIELD_RULES, now=retrieved)
 
     df = df[['Apartment', 'Plan', 'Unit', 'Bedrooms','Beds', 'Baths', 'Sq_ft', 'Rent', 'Availability', 'Retrieved']]
 
     return df
 
 
-def get_nema_listings():
-    html = fetch_page(url=NEMA_URL)
-    listings = parse_page(html)
-    df = extract_data(listings)
-    df = clean_data(df)
-    print(df)
-    insert_data(connection, df)
-    return df
+def get_nema_listings(insert=True, sinks=()):
+    """Scrape NEMA and write its rows to the sinks (and the database if insert), return the row count."""
+    pipeline = Pipeline('nema', clean_data, default_sinks(insert, sinks))
+    page = fetch_page(url=NEMA_URL)
+    return pipeline.run([http_cache.parse(page, lambda html: extract_data(parse_page(html)))])
 
 
 if __name__ == '__main__':
-    df = get_nema_listings()
-    df.to_csv(f'./output/apts/nema_{pd.Timestamp.now().date()}.csv', index=False)
+    get_nema_listings(sinks=[ParquetSink()])
+    http_cache.log_stats()
@@ -1,53 +1,62 @@
 import pandas as pd
-import time
-from io import StringIO
-from bs4 import BeautifulSoup
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-
-from apartments.settings import REED_URL
-from apartments.config import connection
-from apartments.utils import setup_driver, insert_data
-from apartments.log import logger
+
+from settings import REED_URL
+from fetcher import fetch_page
+from extract import parse_html, xpath, class_xpath, read_table
+from driver_pool import driver_pool
+from incremental import crawl_changed
+from lease import fetch_lease_details, log_lease_stats
+from normalize import normalize, number, date
+from metrics import metrics
 
 # NOTE:
 # first page list all floor plans, click each floor plan to get available units, but they are on the same page
 # use select button to redirect to leasing info page to get 12 month rent
 
-def get_unit_details(url=REED_URL):
+FLOOR_PLAN_XPATH = class_xpath('availability-mdl', scope='//')
+FLOOR_PLANS = xpath(class_xpath('js-availability-mdl', scope='//', tag='div'))
+PLAN_HEADER = xpath(class_xpath('availability-mdl__header', tag='div'))
+PLAN_TITLE = xpath('.//h5')
+PLAN_FACTS = xpath('.//p')
+PLAN_TABLE = xpath(class_xpath('availability-mdl__table', tag='div'))
+
+FIELD_RULES = {
+    'Rent': number(),
+    'Sq_ft': number(),
+    'Beds': number(source='Bedrooms', keywords={'Studio': 0, 'Convertible': 0}),
+    'Availability': date(remove=['Available:', 'Available ']),
+}
+
+
+def iter_unit_details(url=REED_URL):
+    """Yield the unit table of every floor plan on the page."""
     # this is irrelevant to get floor plans, because they lie in the same html element
-    driver = setup_driver()
-    driver.get(url)
+    # a list, the parsed tables are stored for the next run if the page doesn't change
+    yield from fetch_page('reed', url, FLOOR_PLAN_XPATH, lambda html: list(parse_floor_plans(html, url)))
+
 
-    soup = BeautifulSoup(driver.page_source, 'html.parser')
-    floor_plans = soup.find_all('div', class_='availability-mdl js-availability-mdl')
+@metrics.timed('parse')
+def parse_floor_plans(page_source, url=REED_URL):
+    """Yield the unit table of every floor plan in the html of the availability page."""
+    floor_plans = FLOOR_PLANS(parse_html(page_source, base_url=url))
     print(f'number of floor plans: {len(floor_plans)}')
 
-    df = pd.DataFrame()
     for fp in floor_plans:
         # fp information:
-        fp_info = fp.find('div', class_='availability-mdl__header')
-        plan = fp_info.find('h5').text
+        fp_info = PLAN_HEADER(fp)[0]
+        plan = PLAN_TITLE(fp_info)[0].text_content()
         print(f'plan: {plan}')
-        p_tags = fp_info.find_all('p')
-        bedrooms = p_tags[0].text
+        p_tags = PLAN_FACTS(fp_info)
+        bedrooms = p_tags[0].text_content()
         bedrooms = bedrooms.replace('Bed', '').strip()
-        baths = p_tags[1].text
+        baths = p_tags[1].text_content()
         baths = baths.replace('Bath', '').strip()
-        sq_ft = p_tags[2].text
+        sq_ft = p_tags[2].text_content()
         print(f'bedrooms: {bedrooms}, baths: {baths}, sq_ft: {sq_ft}')
 
-        # available units using pd read html
-        fp_listings = fp.find('div', class_='availability-mdl__table u-bg-black')
-        fp_df = pd.read_html(StringIO(str(fp_listings)))[0]
-        # print(fp_df)
-
-        # get the href in a tag from the last column
-        hrefs = fp_listings.find_all('a')
-        hrefs = [a['href'] for a in hrefs]
+        # available units, with the href of the a tag in the last column
+        fp_df, links = read_table(PLAN_TABLE(fp)[0])
+        hrefs = [href for row_links in links for href in row_links]
 
         # add plan, bedrooms, baths as new columns to df
         fp_df['Plan'] = plan
@@ -56,48 +65,15 @@ def get_unit_details(url=REED_URL):
         fp_df['SQFT'] = sq_ft
         fp_df['href'] = hrefs
 
-        df = pd.concat([df, fp_df], ignore_index=True)
-
-    print(df)
-
-    driver.quit()
-
-    return df
-
-
-def fetch_unit_details(link):
-    """Fetch details of a unit from its link."""
-    driver = setup_driver()
-    try:
-        driver.get(link)
-        lease_info = driver.find_element(By.ID, 'divTermInfo')
-
-        # TODO: default date is not earliest available date, so we need to pick the date to see 12 month rent
-        date_input = lease_info.find_element(By.ID, 'DateDiv').find_element(By.TAG_NAME, 'input')
-        availability = date_input.get_attribute('value')
-
-        rent_info = lease_info.find_element(By.ID, 'divPricingInfo').text
-        rent = rent_info.split('\n')[1] if rent_info else None
-
-        return availability, rent
-
-    except NoSuchElementException as e:
-        logger.error(f"Element not found: {e}")
-        return None, None
-
-    except Exception as e:
-        logger.error(f"Error fetching unit details: {e}")
-        return None, None
-
-    finally:
-        driver.quit()
+        yield fp_df
 
 
 def get_all_unit_details(df):
     """Fetch details for all units in the DataFrame."""
+    # TODO: default date is not earliest available date, so we need to pick the date to see 12 month rent
     availability_dates, twelve_month_rent = [], []
-    for link in df['href'].tolist():
-        availability, rent = fetch_unit_details(link)
+    for details in crawl_changed(df, 'Reed', fetch_lease_details):
+        availability, rent = details or (None, None)
         availability_dates.append(availability)
         twelve_month_rent.append(rent)
     
@@ -106,7 +82,7 @@ def get_all_unit_details(df):
     return df
 
 
-def clean_data(df):
+def clean_data(df, retrieved):
     df.drop(columns=['View', 'href', 'Rent', 'Date Available'], inplace=True)
     df.rename(columns={
         'SQFT': 'Sq_ft',
@@ -114,30 +90,23 @@ def clean_data(df):
     }, inplace=True)
 
     df['Apartment'] = 'Reed'
-    df['Retrieved'] = pd.Timestamp.now()
+    df['Retrieved'] = retrieved
 
-    df['Rent'] = df['Rent'].str.replace('$', '').str.replace(',', '').str.strip()#.astype(float)
-    df['SQFT'] = df['SQFT'].str.replace('SF', '').str.replace(',', '').str.strip()
-    df['Availability'] = df['Availability'].str.replace('Available ', '').str.strip()
-    df['Beds'] = df['Bedrooms']
-    df.loc[df['Bedrooms'].str.contains('Studio|Convertible'), 'Beds'] = 0
+    df = normalize(df, FIELD_RULES, now=retrieved)
 
-    df['Availability'] = df['Availability'].str.replace('Available:', '').str.strip()
-    df['Availability'] = pd.to_datetime(df['Availability'])
-
-    df = df[['Apartment', 'Plan', 'Unit', 'Bedrooms','Beds', 'Baths', 'Sq_ft', 'Rent', 'Availability', 'Retrieved']]
+    df = df[['Apartment', 'Plan', 'Unit', 'Bedrooms','Beds', 'Baths', 'Sq_ft', 'Rent', 'Availability', 'Retrieved', 'Fingerprint']]
 
     return df
 
 
 def get_reed_listings():
-    df = get_unit_details()
-    df = get_all_unit_details(df)
-    # df = clean_data(df)
-    # insert_data(connection, df)
-    return df
+    # the lease pages don't give the available date yet, so the raw rows are returned instead of going through
+    # Pipeline('reed', clean_data, default_sinks()) like the other spiders
+    return pd.concat([get_all_unit_details(fp_df) for fp_df in iter_unit_details()], ignore_index=True)
 
 
 if __name__ == '__main__':
     df = get_reed_listings()
-    df.to_csv(f'./output/apts/reed_{pd.Timestamp.now().date()}.csv', index=False)
\ No newline at end of file
+    df.to_csv(f'./output/apts/reed_{pd.Timestamp.now().date()}.csv', index=False)
+    driver_pool.log_stats()
+    log_lease_stats()
@@ -0,0 +1,128 @@
+import sys
+
+from settings import STORAGE_MODEL
+from log import logger
+
+# NOTE: daily aggregates
+# daily_availability_stats holds counts, sums and min/max rent per (retrieved date, apartment, beds, source);
+# every insert adds its batch to the matching days in the same transaction, so analysis reads a few
+# hundred aggregate rows instead of the raw history
+#   python stats.py --rebuild   recompute the table from the raw rows
+#   python stats.py --verify    compare the table with a fresh recomputation without changing it
+
+STATS_COLUMNS = ['retrieved_date', 'apartment', 'beds', 'source', 'units', 'rent_units', 'rent_sum', 'rent_min',
+                 'rent_max', 'sqft_sum', 'rent_per_sqft_units', 'rent_per_sqft_sum']
+
+upsert_query = f"""
+INSERT INTO daily_availability_stats ({', '.join(STATS_COLUMNS)}) VALUES %s
+ON CONFLICT (retrieved_date, apartment, beds, source) DO UPDATE SET
+    units = daily_availability_stats.units + EXCLUDED.units,
+    rent_units = daily_availability_stats.rent_units + EXCLUDED.rent_units,
+    rent_sum = coalesce(daily_availability_stats.rent_sum, 0) + coalesce(EXCLUDED.rent_sum, 0),
+    rent_min = LEAST(daily_availability_stats.rent_min, EXCLUDED.rent_min),
+    rent_max = GREATEST(daily_availability_stats.rent_max, EXCLUDED.rent_max),
+    sqft_sum = coalesce(daily_availability_stats.sqft_sum, 0) + coalesce(EXCLUDED.sqft_sum, 0),
+    rent_per_sqft_units = daily_availability_stats.rent_per_sqft_units + EXCLUDED.rent_per_sqft_units,
+    rent_per_sqft_sum = coalesce(daily_availability_stats.rent_per_sqft_sum, 0)
+                        + coalesce(EXCLUDED.rent_per_sqft_sum, 0);
+"""
+
+aggregate_query = """
+SELECT retrieved::date AS retrieved_date, apartment, beds, source, count(*) AS units, count(rent) AS rent_units,
+       sum(rent) AS rent_sum, min(rent) AS rent_min, max(rent) AS rent_max, sum(sqft) AS sqft_sum,
+       count(rent / NULLIF(sqft, 0)) AS rent_per_sqft_units, sum(rent / NULLIF(sqft, 0)) AS rent_per_sqft_sum
+FROM {source}
+GROUP BY retrieved::date, apartment, beds, source
+"""
+
+# rows that differ between the stored and the recomputed aggregates, floats compared with a tolerance
+verify_query = f"""
+SELECT coalesce(s.retrieved_date, f.retrieved_date), coalesce(s.apartment, f.apartment), coalesce(s.beds, f.beds),
+       coalesce(s.source, f.source), s.units, f.units, s.rent_sum, f.rent_sum
+FROM daily_availability_stats s
+FULL JOIN ({aggregate_query}) f
+  ON s.retrieved_date = f.retrieved_date AND s.apartment = f.apartment AND s.beds = f.beds AND s.source = f.source
+WHERE s.units IS DISTINCT FROM f.units OR s.rent_units IS DISTINCT FROM f.rent_units
+   OR s.rent_min IS DISTINCT FROM f.rent_min OR s.rent_max IS DISTINCT FROM f.rent_max
+   OR s.rent_per_sqft_units IS DISTINCT FROM f.rent_per_sqft_units
+   OR abs(coalesce(s.rent_sum, 0) - coalesce(f.rent_sum, 0)) > 0.01
+   OR abs(coalesce(s.sqft_sum, 0) - coalesce(f.sqft_sum, 0)) > 0.01
+   OR abs(coalesce(s.rent_per_sqft_sum, 0) - coalesce(f.rent_per_sqft_sum, 0)) > 0.0001
+ORDER BY 1, 2, 3, 4;
+"""
+
+
+def raw_source():
+    """Table or view with one row per unit per scrape under the active storage model."""
+    return 'availability_snapshots' if STORAGE_MODEL == 'intervals' else 'availabilities'
+
+
+def aggregate_rows(rows):
+    """Aggregate prepared rows (see utils.prepare_rows) the same way aggregate_query does."""
+    import numpy as np
+
+    rows = rows.dropna(subset=['retrieved', 'apartment', 'beds', 'source']).assign(
+        retrieved_date=lambda df: df['retrieved'].dt.date,
+        rent_per_sqft=lambda df: df['rent'] / df['sqft'].replace(0, np.nan),
+    )
+    grouped = rows.groupby(['retrieved_date', 'apartment', 'beds', 'source'])
+    stats = grouped.agg(
+        units=('unit', 'size'),
+        rent_units=('rent', 'count'),
+        rent_sum=('rent', 'sum'),
+        rent_min=('rent', 'min'),
+        rent_max=('rent', 'max'),
+        sqft_sum=('sqft', 'sum'),
+        rent_per_sqft_units=('rent_per_sqft', 'count'),
+        rent_per_sqft_sum=('rent_per_sqft', 'sum'),
+    ).reset_index()
+    return stats[STATS_COLUMNS]
+
+
+def update_daily_stats(cursor, rows):
+    """Add a batch of prepared rows to daily_availability_stats, in the caller's transaction."""
+    from psycopg2.extras import execute_values
+
+    stats = aggregate_rows(rows)
+    records = [
+        tuple(None if value != value else value for value in record)    # NaN -> NULL
+        for record in stats.astype(object).itertuples(index=False, name=None)
+    ]
+    execute_values(cursor, upsert_query, records)
+
+
+def rebuild_daily_stats(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('LOCK TABLE daily_availability_stats IN EXCLUSIVE MODE')
+        cursor.execute('TRUNCATE daily_availability_stats')
+        cursor.execute(f"INSERT INTO daily_availability_stats ({', '.join(STATS_COLUMNS)}) "
+                       f"{aggregate_query.format(source=raw_source())}")
+        count = cursor.rowcount
+    conn.commit()
+    logger.info(f"Rebuilt daily_availability_stats from {raw_source()}: {count} rows")
+
+
+def verify_daily_stats(conn):
+    """Log the aggregate rows that don't match the raw rows, return how many there are."""
+    with conn.cursor() as cursor:
+        cursor.execute(verify_query.format(source=raw_source()))
+        mismatches = cursor.fetchall()
+    conn.commit()
+    for date, apartment, beds, source, units, expected_units, rent_sum, expected_rent_sum in mismatches[:50]:
+        logger.warning(f"{date} {apartment} ({source}) beds={beds}: units {units} (expected {expected_units}), "
+                       f"rent_sum {rent_sum} (expected {expected_rent_sum})")
+    logger.info(f"daily_availability_stats: {len(mismatches)} rows differ from {raw_source()}")
+    return len(mismatches)
+
+
+if __name__ == '__main__':
+    from config import db
+
+    if '--rebuild' in sys.argv:
+        with db.connection() as conn:
+            rebuild_daily_stats(conn)
+    elif '--verify' in sys.argv:
+        with db.connection() as conn:
+            sys.exit(1 if verify_daily_stats(conn) else 0)
+    else:
+        sys.exit('usage: python stats.py --rebuild | --verify')
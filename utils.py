@@ -1,45 +1,204 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from fake_useragent import UserAgent
 import os
+import json
+import random
 
-ua = UserAgent()
+from settings import (FAST_STARTUP, CACHE_DIR, DRIVER_PATH_CACHE, USER_AGENT_CACHE, USER_AGENT_SAMPLES,
+                      PAGE_LOAD_STRATEGY, STORAGE_MODEL, INSERT_METHOD, INSERT_BATCH_SIZE, INSERT_PAGE_SIZE,
+                      OFFICIAL_SOURCE)
+
+# NOTE: selenium, webdriver_manager and fake_useragent are imported inside the functions that need them,
+# so spiders that never open a browser (e.g. NEMA) don't pay for those imports
+
+# NOTE: bulk inserts
+# rows are coerced column-wise with pandas and streamed with COPY FROM STDIN instead of one INSERT per row,
+# a failed batch is rolled back as a whole
+
+_user_agents = None
+
+
+def _read_cache(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(path, value):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(value, f)
+
+
+def get_driver_path(refresh=False):
+    """Resolve the chromedriver path once per machine and reuse it from the cache file afterwards."""
+    if FAST_STARTUP and not refresh:
+        cached = _read_cache(DRIVER_PATH_CACHE)
+        if cached and os.path.exists(cached.get('path', '')):
+            return cached['path']
+
+    from webdriver_manager.chrome import ChromeDriverManager
+    driver_path = ChromeDriverManager().install()
+    if FAST_STARTUP:
+        _write_cache(DRIVER_PATH_CACHE, {'path': driver_path})
+    return driver_path
+
+
+def get_user_agent():
+    """Pick a random user agent, loading the list from the local cache file on first use."""
+    global _user_agents
+    if _user_agents is None and FAST_STARTUP:
+        _user_agents = _read_cache(USER_AGENT_CACHE)
+
+    if not _user_agents:
+        from fake_useragent import UserAgent
+        ua = UserAgent()
+        _user_agents = list({ua.random for _ in range(USER_AGENT_SAMPLES)})
+        if FAST_STARTUP:
+            _write_cache(USER_AGENT_CACHE, _user_agents)
+
+    return random.choice(_user_agents)
+
+
+def setup_driver(headless=True, page_load_strategy=PAGE_LOAD_STRATEGY, user_data_dir=None):
+    """
+    Start a chrome session.
+    :param page_load_strategy: 'eager' returns from driver.get at DOMContentLoaded, 'normal' waits for every resource
+    :param user_data_dir: persistent profile directory, static assets are then served from chrome's disk cache
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.common.exceptions import SessionNotCreatedException
 
-def setup_driver(headless=True):
     options = webdriver.ChromeOptions()
     if headless:
         options.add_argument('--headless')
-    options.add_argument(f'user-agent={ua.random}') # add user agent to pass bot detection, o.w. add click action
+    options.page_load_strategy = page_load_strategy
+    if user_data_dir:
+        options.add_argument(f'--user-data-dir={user_data_dir}')
+    options.add_argument(f'user-agent={get_user_agent()}') # add user agent to pass bot detection, o.w. add click action
     options.add_experimental_option('excludeSwitches', ['enable-logging'])
 
-    driver_path = ChromeDriverManager().install()
-    service = Service(driver_path)
-    
-    driver = webdriver.Chrome(service=service, options=options)
+    try:
+        driver = webdriver.Chrome(service=Service(get_driver_path()), options=options)
+    except SessionNotCreatedException:
+        # cached chromedriver no longer matches the installed chrome, resolve it again
+        driver = webdriver.Chrome(service=Service(get_driver_path(refresh=True)), options=options)
     return driver
 
 
-def insert_data(conn, data):
-    cursor = conn.cursor()
-    insert_query = """
-    INSERT INTO availabilities (apartment, plan, unit, bedrooms, beds, baths, sqft, rent, available_date, retrieved)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+# dataframe column -> availabilities column, in insert order
+INSERT_COLUMNS = {
+    'Apartment': 'apartment',
+    'Plan': 'plan',
+    'Unit': 'unit',
+    'Bedrooms': 'bedrooms',
+    'Beds': 'beds',
+    'Baths': 'baths',
+    'Sq_ft': 'sqft',
+    'Rent': 'rent',
+    'Availability': 'available_date',
+    'Retrieved': 'retrieved',
+    'Fingerprint': 'fingerprint',
+    'Source': 'source',
+}
+TEXT_COLUMNS = ['apartment', 'plan', 'unit', 'bedrooms', 'fingerprint', 'source']
+# written when a spider doesn't set the column (or leaves it empty), COPY would send NULL instead of using the
+# column default
+COLUMN_DEFAULTS = {'source': OFFICIAL_SOURCE}
+FLOAT_COLUMNS = ['beds', 'baths', 'sqft', 'rent']
+
+
+def prepare_rows(data):
+    """
+    Coerce a cleaned spider dataframe to the availabilities columns, column by column.
+    Numbers and dates that don't parse become NULL.
+    """
+    import pandas as pd
+
+    rows = pd.DataFrame(index=data.index)
+    for column, db_column in INSERT_COLUMNS.items():
+        default = COLUMN_DEFAULTS.get(db_column)
+        values = data[column] if column in data.columns else pd.Series(default, index=data.index, dtype=object)
+        if default is not None:
+            values = values.fillna(default)
+        if db_column in FLOAT_COLUMNS:
+            values = pd.to_numeric(values, errors='coerce')
+        elif db_column == 'available_date':
+            # midnight timestamps are written as plain dates
+            values = pd.to_datetime(values, errors='coerce').dt.normalize()
+        elif db_column == 'retrieved':
+            values = pd.to_datetime(values, errors='coerce')
+        else:
+            values = values.astype('string')
+        rows[db_column] = values
+    return rows.reset_index(drop=True)
+
+
+def _copy_batch(cursor, rows, table):
+    import io
+    buffer = io.StringIO()
+    rows.to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(rows.columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+    )
+
+
+def _values_batch(cursor, rows, table):
+    from psycopg2.extras import execute_values
+    records = rows.astype(object).where(rows.notna(), None).itertuples(index=False, name=None)
+    execute_values(
+        cursor, f"INSERT INTO {table} ({', '.join(rows.columns)}) VALUES %s", records, page_size=INSERT_PAGE_SIZE
+    )
+
+
+def insert_data(conn, data, table='availabilities', method=INSERT_METHOD, batch_size=INSERT_BATCH_SIZE):
+    """
+    Bulk insert a cleaned spider dataframe, one transaction per batch of batch_size rows.
+    With STORAGE_MODEL = 'intervals' the rows go to listing_intervals instead, see intervals.py.
+    :param method: 'copy' streams the batch with COPY FROM STDIN, 'values' sends multi-row INSERTs;
+                   copy falls back to values if the server refuses COPY (e.g. behind some poolers)
+    :return: number of rows inserted
     """
-    for _, row in data.iterrows():
-        cursor.execute(insert_query, (
-            row['Apartment'], row['Plan'], row['Unit'],
-            row['Bedrooms'], row['Beds'], row['Baths'], 
-            row['Sq_ft'], row['Rent'], row['Availability'], 
-            row['Retrieved']
-        ))
-    conn.commit()
-    cursor.close()
+    import psycopg2
+
+    if STORAGE_MODEL == 'intervals' and table == 'availabilities':
+        from intervals import insert_intervals
+        return insert_intervals(conn, data)
+
+    from stats import update_daily_stats
+
+    def write_batch(batch, method):
+        with conn.cursor() as cursor:
+            if method == 'copy':
+                _copy_batch(cursor, batch, table)
+            else:
+                _values_batch(cursor, batch, table)
+            # the daily aggregates move in the same transaction as the rows they count
+            if table == 'availabilities':
+                update_daily_stats(cursor, batch)
+        conn.commit()
+
+    rows = prepare_rows(data)
+    for start in range(0, len(rows), batch_size):
+        batch = rows.iloc[start:start + batch_size]
+        try:
+            write_batch(batch, method)
+        except psycopg2.NotSupportedError:
+            conn.rollback()
+            if method != 'copy':
+                raise
+            from metrics import metrics
+            metrics.count('retries')
+            method = 'values'
+            write_batch(batch, method)
+        except Exception:
+            conn.rollback()
+            raise
     print("Data inserted successfully into the database.")
+    return len(rows)
 
 
 if __name__ == '__main__':
-    driver = setup_driver()
\ No newline at end of file
+    driver = setup_driver()